@@ -1,8 +1,13 @@
 import os
 from flask import Flask
-from db import db
+from db import REPLICA_BIND, db, engine_options
 from routes import api_routes
 from auth import auth_routes
+from imports import import_routes
+from exports import export_routes
+from cache import set_publish_boundary, start_invalidation_listener
+from catalog import READ_TIME_PUBLISHING, drain_rebuild_queue, rebuild_gone_live_documents
+from metrics import init_metrics
 
 app = Flask(__name__)
 
@@ -11,16 +16,44 @@ app.secret_key = "supersecretkey"   # for sessions
 # Database
 app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("DATABASE_URL")
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options("DB")
+
+# Optional read replica for public catalog reads (see db.replica_reads)
+if os.getenv("REPLICA_DATABASE_URL"):
+    app.config["SQLALCHEMY_BINDS"] = {
+        REPLICA_BIND: {"url": os.getenv("REPLICA_DATABASE_URL"), **engine_options("REPLICA_DB", connect_timeout=2)}
+    }
 
 db.init_app(app)
 
 # Register blueprints
 app.register_blueprint(api_routes)
 app.register_blueprint(auth_routes)
+app.register_blueprint(import_routes)
+app.register_blueprint(export_routes)
+
+init_metrics(app)
+
+def rebuild_queued_documents():
+    with app.app_context():
+        drain_rebuild_queue()
+        if READ_TIME_PUBLISHING:
+            set_publish_boundary(rebuild_gone_live_documents())
+
+def start_rebuild_consumer():
+    """Start this process's catalog listener, which also drains the worker's rebuild queue."""
+    return start_invalidation_listener(app.config["SQLALCHEMY_DATABASE_URI"], on_wake=rebuild_queued_documents)
+
+@app.before_request
+def ensure_cache_listener():
+    # Started at process start; this covers server processes forked after it
+    start_rebuild_consumer()
 
 @app.route("/health")
 def health():
     return {"status": "ok"}
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", debug=True)
+    # Not lazily: worker publishes must reach the documents before any request does
+    start_rebuild_consumer()
+    app.run(host="0.0.0.0", debug=os.getenv("FLASK_DEBUG") == "1")
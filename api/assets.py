@@ -0,0 +1,186 @@
+import uuid
+
+from sqlalchemy.dialects.postgresql import insert
+
+from db import db
+from models import Program, Term, Lesson, ProgramAsset, LessonAsset
+from publishing import notify_schedule_changed
+
+# Rows per INSERT ... ON CONFLICT statement
+UPSERT_CHUNK_SIZE = 1000
+
+ASSET_MODELS = {
+    "program": (ProgramAsset, "program_id", "poster", "uniq_program_asset"),
+    "lesson": (LessonAsset, "lesson_id", "thumbnail", "uniq_lesson_asset"),
+}
+
+
+# -----------------------
+# PUBLISH READINESS
+# -----------------------
+
+REFRESH_PROGRAM_READINESS_SQL = """
+UPDATE programs AS p SET
+    has_portrait_poster = EXISTS (
+        SELECT 1 FROM program_assets a
+        WHERE a.program_id = p.id AND a.language = p.language_primary
+          AND a.asset_type = 'poster' AND a.variant = 'portrait'
+    ),
+    has_landscape_poster = EXISTS (
+        SELECT 1 FROM program_assets a
+        WHERE a.program_id = p.id AND a.language = p.language_primary
+          AND a.asset_type = 'poster' AND a.variant = 'landscape'
+    )
+"""
+
+REFRESH_LESSON_READINESS_SQL = """
+UPDATE lessons AS l SET
+    has_portrait_thumbnail = EXISTS (
+        SELECT 1 FROM lesson_assets a
+        WHERE a.lesson_id = l.id AND a.language = l.content_language_primary
+          AND a.asset_type = 'thumbnail' AND a.variant = 'portrait'
+    ),
+    has_landscape_thumbnail = EXISTS (
+        SELECT 1 FROM lesson_assets a
+        WHERE a.lesson_id = l.id AND a.language = l.content_language_primary
+          AND a.asset_type = 'thumbnail' AND a.variant = 'landscape'
+    ),
+    -- l.ready_at is the old value: kept while the lesson stays ready, stamped when it becomes ready
+    ready_at = CASE WHEN (
+        SELECT count(DISTINCT a.variant) = 2 FROM lesson_assets a
+        WHERE a.lesson_id = l.id AND a.language = l.content_language_primary
+          AND a.asset_type = 'thumbnail' AND a.variant IN ('portrait', 'landscape')
+    ) THEN COALESCE(l.ready_at, timezone('utc', now())) END
+"""
+
+
+def _refresh(sql, ids):
+    if ids is None:
+        return db.session.execute(db.text(sql + " RETURNING status")).all()
+    ids = [i for i in set(ids) if i]
+    if not ids:
+        return []
+    return db.session.execute(db.text(sql + " WHERE id = ANY(CAST(:ids AS uuid[])) RETURNING status"), {"ids": ids}).all()
+
+
+def refresh_program_readiness(program_ids=None):
+    """Recompute poster readiness flags (all programs when None)."""
+    _refresh(REFRESH_PROGRAM_READINESS_SQL, program_ids)
+
+
+def refresh_lesson_readiness(lesson_ids=None):
+    """Recompute thumbnail readiness flags (all lessons when None).
+
+    Wakes the worker if a scheduled lesson was touched, since it may
+    have just become publishable.
+    """
+    rows = _refresh(REFRESH_LESSON_READINESS_SQL, lesson_ids)
+    if any(status == "scheduled" for (status,) in rows):
+        notify_schedule_changed()
+
+
+REFRESH_READINESS = {
+    "program": refresh_program_readiness,
+    "lesson": refresh_lesson_readiness,
+}
+
+
+# -----------------------
+# ASSET UPSERTS
+# -----------------------
+
+def upsert_statement(model, constraint):
+    stmt = insert(model)
+    return stmt.on_conflict_do_update(
+        constraint=constraint,
+        set_={"url": stmt.excluded.url, "updated_at": stmt.excluded.updated_at}
+    )
+
+
+def upsert_asset(kind, owner_id, language, variant, url):
+    """Insert or replace one asset and refresh the owner's readiness.
+
+    Returns the id of the stored row.
+    """
+    model, owner_column, asset_type, constraint = ASSET_MODELS[kind]
+    asset_id = db.session.execute(
+        upsert_statement(model, constraint).returning(model.id),
+        {
+            "id": str(uuid.uuid4()),
+            owner_column: owner_id,
+            "language": language,
+            "variant": variant,
+            "asset_type": asset_type,
+            "url": url
+        }
+    ).scalar_one()
+    REFRESH_READINESS[kind]([owner_id])
+    return asset_id
+
+
+def owner_program_ids(kind, owner_ids):
+    """Map owner (program or lesson) ids to program ids; unknown ids are absent."""
+    if kind == "program":
+        rows = db.session.query(Program.id, Program.id).filter(Program.id.in_(owner_ids))
+    else:
+        rows = db.session.query(Lesson.id, Term.program_id).join(Term, Lesson.term_id == Term.id).filter(
+            Lesson.id.in_(owner_ids)
+        )
+    return dict(rows.all())
+
+
+def validate_asset_batch(kind, items):
+    """Validate a batch of asset rows.
+
+    Returns (rows, program_ids, errors). Rows are de-duplicated on the
+    unique key (last one wins), since one statement can't update the
+    same row twice.
+    """
+    _, owner_column, default_type, _ = ASSET_MODELS[kind]
+    errors = []
+    rows = {}
+
+    if not isinstance(items, list) or not items:
+        return [], set(), [{"path": "assets", "message": "must be a non-empty list"}]
+
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append({"path": f"assets[{i}]", "message": "must be an object"})
+            continue
+        item_errors = [
+            {"path": f"assets[{i}].{field}", "message": "is required"}
+            for field in (owner_column, "language", "variant", "url")
+            if not isinstance(item.get(field), str) or not item[field]
+        ]
+        asset_type = item.get("asset_type", default_type)
+        if asset_type != default_type:
+            item_errors.append({"path": f"assets[{i}].asset_type", "message": f"must be {default_type!r}"})
+        if item_errors:
+            errors.extend(item_errors)
+            continue
+
+        key = (item[owner_column], item["language"], item["variant"])
+        rows[key] = (i, {
+            "id": str(uuid.uuid4()),
+            owner_column: item[owner_column],
+            "language": item["language"],
+            "variant": item["variant"],
+            "asset_type": asset_type,
+            "url": item["url"]
+        })
+
+    program_ids = owner_program_ids(kind, {key[0] for key in rows})
+    for (owner_id, _, _), (i, _) in rows.items():
+        if owner_id not in program_ids:
+            errors.append({"path": f"assets[{i}].{owner_column}", "message": f"{kind} not found"})
+
+    return [row for _, row in rows.values()], set(program_ids.values()), errors
+
+
+def upsert_asset_batch(kind, rows):
+    """Upsert validated rows with one INSERT ... ON CONFLICT DO UPDATE per chunk."""
+    model, owner_column, _, constraint = ASSET_MODELS[kind]
+    stmt = upsert_statement(model, constraint)
+    for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        db.session.execute(stmt, rows[start:start + UPSERT_CHUNK_SIZE])
+    REFRESH_READINESS[kind]({row[owner_column] for row in rows})
@@ -0,0 +1,257 @@
+"""Latency and SQL statement counts for the catalog and admin endpoints
+and one worker cycle, against the database in DATABASE_URL.
+
+    python generate_catalog.py --programs 1000 --terms 5 --lessons 20 --reset
+    python benchmark.py --output before.json
+    python benchmark.py --compare before.json after.json
+
+Requests go through the Flask test client in this process, so latencies
+are app + database time without an HTTP server in front. The catalog
+cache is cleared before every request (pass --cached to measure hits).
+The worker cycle publishes whatever is due, so it is measured once.
+"""
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+WORKER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "worker")
+
+# Full-body endpoints are slower per request; sample them less
+STREAMING_ENDPOINTS = ("catalog_ui", "export_catalog")
+
+# Per thread, so the cache listener's background rebuilds aren't counted
+_counter = threading.local()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def count_statement(conn, cursor, statement, parameters, context, executemany):
+    _counter.statements = getattr(_counter, "statements", 0) + 1
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a sorted list."""
+    return values[max(math.ceil(pct / 100 * len(values)) - 1, 0)]
+
+
+def summarize(latencies, statements):
+    latencies = sorted(latencies)
+    return {
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 3),
+            "p90": round(percentile(latencies, 90), 3),
+            "p95": round(percentile(latencies, 95), 3),
+            "p99": round(percentile(latencies, 99), 3),
+            "max": round(latencies[-1], 3),
+            "mean": round(sum(latencies) / len(latencies), 3),
+        },
+        "statements": {
+            "min": min(statements),
+            "max": max(statements),
+            "mean": round(sum(statements) / len(statements), 2),
+        }
+    }
+
+
+def sample_ids():
+    """Ids and values from the current data for the parameterised endpoints."""
+    from db import db
+    from models import Program, Lesson, Topic
+
+    def first(query):
+        return db.session.execute(query.limit(1)).scalar()
+
+    in_catalog = Program.published_lesson_count > 0
+    return {
+        "program_id": first(db.select(Program.id).where(in_catalog).order_by(Program.published_lesson_count.desc())),
+        "language": first(db.select(Program.language_primary).where(in_catalog)),
+        "lesson_id": first(db.select(Lesson.id).where(Lesson.status == "published")),
+        "draft_lesson_id": first(db.select(Lesson.id).where(Lesson.status == "draft")),
+        "topic_id": first(db.select(Topic.id).order_by(Topic.name)),
+    }
+
+
+def endpoints(client):
+    from app import app
+
+    with app.app_context():
+        ids = sample_ids()
+    page_two = client.get("/catalog/programs").get_json().get("next_cursor") or ""
+
+    catalog = {
+        "catalog_programs": "/catalog/programs",
+        "catalog_programs_page_2": f"/catalog/programs?cursor={page_two}",
+        "catalog_programs_language": f"/catalog/programs?language={ids['language']}",
+        "catalog_programs_subtitle": f"/catalog/programs?subtitle={ids['language']}",
+        "catalog_programs_topic": f"/catalog/programs?topic={ids['topic_id']}",
+        "catalog_program": f"/catalog/programs/{ids['program_id']}",
+        "catalog_lesson": f"/catalog/lessons/{ids['lesson_id']}",
+        "catalog_search": "/catalog/search?q=python",
+        "catalog_search_lang": f"/catalog/search?q=python&lang={ids['language']}",
+        "catalog_changes": "/catalog/changes",
+        "catalog_ui": "/catalog-ui",
+        "export_catalog": "/export/catalog",
+        "topics": "/topics",
+    }
+    admin = {
+        "dashboard": "/dashboard",
+        "ui_programs": "/ui/programs",
+        "ui_programs_search": "/ui/programs?q=python&sort=title&dir=asc",
+        "ui_programs_last_page": "/ui/programs?page=1000000",
+        "ui_program_detail": f"/ui/programs/{ids['program_id']}",
+        "ui_lesson_detail": f"/ui/lessons/{ids['draft_lesson_id'] or ids['lesson_id']}",
+        "ui_not_ready": "/ui/not-ready",
+    }
+    return {**catalog, **admin}
+
+
+def measure(client, path, requests, cached):
+    from cache import clear_caches
+
+    latencies, statements, status = [], [], None
+
+    client.get(path).get_data()  # warm-up: compiled statement cache, pool, templates
+    for _ in range(requests):
+        if not cached:
+            clear_caches()
+        _counter.statements = 0
+        started = time.perf_counter()
+        response = client.get(path)
+        response.get_data()  # drain streamed bodies
+        latencies.append((time.perf_counter() - started) * 1000)
+        statements.append(_counter.statements)
+        status = response.status_code
+
+    return {"path": path, "status": status, "requests": requests, **summarize(latencies, statements)}
+
+
+def measure_worker_cycle():
+    """One worker wakeup: publish all due lessons, then the gauges and next-due lookup."""
+    sys.path.insert(0, WORKER_DIR)
+    import worker
+
+    with worker.app.app_context():
+        due = worker.db.session.execute(worker.db.text(worker.BACKLOG_SQL)).one()[0]
+        worker.db.session.commit()
+
+        _counter.statements = 0
+        started = time.perf_counter()
+        worker.run_cycle()
+        elapsed = (time.perf_counter() - started) * 1000
+
+    return {
+        "lessons_due": due,
+        "latency_ms": round(elapsed, 3),
+        "statements": _counter.statements,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def dataset():
+    from app import app
+    from db import db
+
+    with app.app_context():
+        return {
+            table: db.session.execute(db.text(f"SELECT count(*) FROM {table}")).scalar()
+            for table in ("programs", "terms", "lessons", "program_assets", "lesson_assets")
+        }
+
+
+def run(requests, stream_requests, cached, worker_cycle):
+    # Imported here so --compare works without a database
+    from app import app
+
+    print("⏱ Benchmarking...", file=sys.stderr)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["user"] = "admin"
+        session["role"] = "admin"
+
+    results = {
+        "commit": git_commit(),
+        "run_at": datetime.utcnow().isoformat(),
+        "cached": cached,
+        "dataset": dataset(),
+        "endpoints": {},
+    }
+    for name, path in endpoints(client).items():
+        count = stream_requests if name in STREAMING_ENDPOINTS else requests
+        results["endpoints"][name] = measure(client, path, count, cached)
+        latency = results["endpoints"][name]["latency_ms"]
+        print(
+            f"  {name:28} p50 {latency['p50']:9.2f} ms  p95 {latency['p95']:9.2f} ms  "
+            f"{results['endpoints'][name]['statements']['max']:4} stmt",
+            file=sys.stderr
+        )
+
+    if worker_cycle:
+        results["worker_cycle"] = measure_worker_cycle()
+        print(f"  worker_cycle: {results['worker_cycle']}", file=sys.stderr)
+
+    print("✅ Benchmark complete!", file=sys.stderr)
+    return results
+
+
+def compare(before_path, after_path):
+    """Print p50/p95 latency and statement count changes between two result files."""
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print(f"{'endpoint':28} {'p50 ms':>21} {'p95 ms':>21} {'statements':>12}")
+
+    def change(old, new):
+        if not old:
+            return f"{old:>8} -> {new:<8}"
+        return f"{old:>8} -> {new:<8} ({(new - old) / old:+.0%})"
+
+    for name, result in after["endpoints"].items():
+        old = before["endpoints"].get(name)
+        if old is None:
+            print(f"{name:28} (new)")
+            continue
+        print(
+            f"{name:28} {change(old['latency_ms']['p50'], result['latency_ms']['p50'])} "
+            f"{change(old['latency_ms']['p95'], result['latency_ms']['p95'])} "
+            f"{old['statements']['max']:>5} -> {result['statements']['max']}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark catalog, admin and worker paths")
+    parser.add_argument("--requests", type=int, default=50, help="requests per endpoint")
+    parser.add_argument("--stream-requests", type=int, default=3, help="requests for /catalog-ui and the export")
+    parser.add_argument("--cached", action="store_true", help="keep the catalog cache between requests")
+    parser.add_argument("--no-worker", action="store_true", help="skip the worker cycle (it publishes due lessons)")
+    parser.add_argument("--output", help="write results as JSON to this path (default: stdout)")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="diff two result files")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        sys.exit(0)
+
+    results = run(args.requests, args.stream_requests, args.cached, not args.no_worker)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
@@ -0,0 +1,263 @@
+import json
+import math
+import os
+import select
+import threading
+import time
+from collections import OrderedDict
+
+import psycopg2
+
+from db import hold_primary_reads
+from metrics import CACHE_LOOKUPS
+
+CATALOG_CHANNEL = "catalog_changed"
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", "300"))
+CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", "1024"))
+# One entry per program for /catalog-ui, so size it to the catalog
+CATALOG_FRAGMENT_CACHE_SIZE = int(os.getenv("CATALOG_FRAGMENT_CACHE_SIZE", "4096"))
+
+# Longest the listener sleeps without a notification
+LISTEN_IDLE_SECONDS = 60
+
+# Programs per NOTIFY payload; larger changes invalidate everything
+# instead (Postgres caps payloads at 8000 bytes).
+MAX_NOTIFY_IDS = 100
+INVALIDATE_ALL = "*"
+
+
+class _Flight:
+    """A build in progress that concurrent misses wait on."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class CatalogCache:
+    """In-process LRU + TTL cache for catalog payloads.
+
+    Entries carry tags ("programs" for listings, "program:<id>" for
+    anything rendered from one program) and are dropped by tag when a
+    catalog_changed notification arrives. Concurrent misses on one key
+    share a single build. The cache is bypassed until the invalidation
+    listener is connected, so it never serves entries it can't expire.
+
+    Under read-time publishing nothing outlives the next scheduled
+    go-live (see set_publish_boundary).
+    """
+
+    def __init__(self, name, max_entries=CATALOG_CACHE_SIZE, ttl=CATALOG_CACHE_TTL):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = False
+        self._entries = OrderedDict()  # key -> (expires_at, tags, value)
+        self._inflight = {}
+        self._generation = 0
+        self._publish_boundary = math.inf  # time.monotonic() of the next go-live
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key, builder, tags=()):
+        """Return the cached value for key, building it on a miss.
+
+        tags may be a callable receiving the built value. None results
+        are returned but never cached.
+        """
+        if not self.enabled:
+            CACHE_LOOKUPS.labels(self.name, "bypass").inc()
+            return builder()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                CACHE_LOOKUPS.labels(self.name, "hit").inc()
+                return entry[2]
+
+            CACHE_LOOKUPS.labels(self.name, "miss").inc()
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+                generation = self._generation
+
+        if not leader:
+            flight.event.wait()
+            if flight.error:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = builder()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+                # Skip storing if an invalidation landed mid-build, or a go-live
+                # passed and the listener hasn't looked up the next one yet
+                if (flight.error is None and flight.value is not None and generation == self._generation
+                        and time.monotonic() < self._publish_boundary):
+                    entry_tags = tags(flight.value) if callable(tags) else tags
+                    self._store(key, flight.value, entry_tags)
+            flight.event.set()
+
+        return flight.value
+
+    def _store(self, key, value, tags):
+        expires_at = min(time.monotonic() + self.ttl, self._publish_boundary)
+        self._entries[key] = (expires_at, frozenset(tags), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate_programs(self, program_ids):
+        """Drop listings and every entry rendered from the given programs."""
+        doomed = {"programs"} | {f"program:{pid}" for pid in program_ids}
+        with self._lock:
+            self._generation += 1
+            for key in [k for k, (_, tags, _) in self._entries.items() if tags & doomed]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def set_publish_boundary(self, delay):
+        """Expire every entry in delay seconds, when the next scheduled lesson goes live.
+
+        None means nothing is scheduled. Once the boundary passes, results
+        are built but not stored until the next one is set.
+        """
+        boundary = math.inf if delay is None else time.monotonic() + max(delay, 0)
+        with self._lock:
+            self._publish_boundary = boundary
+            for key, (expires_at, tags, value) in list(self._entries.items()):
+                if expires_at > boundary:
+                    self._entries[key] = (boundary, tags, value)
+
+    def seconds_to_publish_boundary(self):
+        return self._publish_boundary - time.monotonic()
+
+
+catalog_cache = CatalogCache("payloads")
+# Rendered /catalog-ui fragments, kept apart so one full page render
+# can't push every listing and detail payload out of catalog_cache
+fragment_cache = CatalogCache("fragments", max_entries=CATALOG_FRAGMENT_CACHE_SIZE)
+CACHES = (catalog_cache, fragment_cache)
+
+
+def invalidate_programs(program_ids):
+    for cache in CACHES:
+        cache.invalidate_programs(program_ids)
+
+
+def clear_caches():
+    for cache in CACHES:
+        cache.clear()
+
+
+def set_publish_boundary(delay):
+    for cache in CACHES:
+        cache.set_publish_boundary(delay)
+
+
+# -----------------------
+# CROSS-PROCESS INVALIDATION
+# -----------------------
+
+def notify_payloads(program_ids):
+    """NOTIFY payloads announcing that the given programs changed."""
+    program_ids = sorted({pid for pid in program_ids if pid})
+    if not program_ids:
+        return []
+    if len(program_ids) > MAX_NOTIFY_IDS:
+        return [INVALIDATE_ALL]
+    return [json.dumps(program_ids)]
+
+
+def apply_notification(payload):
+    hold_primary_reads()
+    if payload == INVALIDATE_ALL:
+        clear_caches()
+    else:
+        invalidate_programs(json.loads(payload))
+
+
+def _wake(on_wake):
+    if on_wake is None:
+        return
+    try:
+        on_wake()
+    except Exception as e:
+        print("❌ Catalog listener callback error:", e)
+
+
+def _listen(dsn, on_wake):
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(dsn)
+            conn.autocommit = True
+            conn.cursor().execute(f"LISTEN {CATALOG_CHANNEL}")
+
+            # Anything cached before (re)connecting may have missed a notify
+            clear_caches()
+            for cache in CACHES:
+                cache.enabled = True
+            _wake(on_wake)
+
+            while True:
+                # Wake at the next go-live too, so on_wake can catch up with it
+                timeout = catalog_cache.seconds_to_publish_boundary()
+                if not 0 < timeout < LISTEN_IDLE_SECONDS:
+                    timeout = LISTEN_IDLE_SECONDS
+                if select.select([conn], [], [], timeout) != ([], [], []):
+                    conn.poll()
+                    while conn.notifies:
+                        apply_notification(conn.notifies.pop(0).payload)
+                # Also runs on idle timeouts, as a safety net for missed wakeups
+                _wake(on_wake)
+
+        except Exception as e:
+            for cache in CACHES:
+                cache.enabled = False
+            clear_caches()
+            print("❌ Catalog cache listener error:", e)
+            time.sleep(1)
+        finally:
+            if conn is not None:
+                conn.close()
+
+
+_listener_lock = threading.Lock()
+_listener = None
+
+
+def _forget_listener():
+    # Threads don't survive fork: a forked server process starts its own
+    global _listener
+    _listener = None
+
+
+os.register_at_fork(after_in_child=_forget_listener)
+
+
+def start_invalidation_listener(dsn, on_wake=None):
+    """Start this process's LISTEN thread (idempotent); returns the thread.
+
+    on_wake, if given, runs on the listener thread after connecting,
+    after each batch of notifications and on idle timeouts.
+    """
+    global _listener
+    with _listener_lock:
+        if _listener is None:
+            _listener = threading.Thread(
+                target=_listen, args=(dsn, on_wake), name="catalog-cache-listener", daemon=True
+            )
+            _listener.start()
+        return _listener
@@ -0,0 +1,1127 @@
+import base64
+import heapq
+import json
+import os
+from datetime import datetime
+from itertools import groupby
+from sqlalchemy.dialects.postgresql import insert
+from db import db, pin_primary_reads
+from cache import CATALOG_CHANNEL, notify_payloads
+from models import (
+    Program, Term, Lesson, ProgramAsset, LessonAsset, Topic, ProgramTopic,
+    CatalogChange, CatalogDocument, CatalogLessonDocument, NIL_ID, SEARCH_CONFIGS, parse_id
+)
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+PROGRAM_STATUSES = ("draft", "published", "archived")
+MAX_TOPIC_FILTERS = 10
+
+
+class CatalogQueryError(ValueError):
+    """Invalid catalog query parameters (reported to clients as 400)."""
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+# -----------------------
+# LIVE LESSONS
+# -----------------------
+
+# Off: a lesson joins the catalog when the worker publishes it. On: a
+# scheduled lesson joins it the moment its publish_at passes (given its
+# thumbnails, the worker's own rule), evaluated by the catalog queries
+# themselves; the worker then only persists the state.
+READ_TIME_PUBLISHING = os.getenv("CATALOG_READ_TIME_PUBLISHING", "false").lower() == "true"
+
+# Same rows as the worker's CLAIM_AND_PUBLISH_SQL; served by ix_lessons_scheduled_ready_publish_at
+DUE_LESSON_SQL = (
+    "{l}.status = 'scheduled' AND {l}.publish_at <= now() "
+    "AND {l}.has_portrait_thumbnail AND {l}.has_landscape_thumbnail"
+)
+
+
+def due_since(lesson):
+    """When a due lesson went live: its publish_at, or later if its thumbnails arrived after it."""
+    return max((t for t in (lesson.publish_at, lesson.ready_at) if t), default=None)
+
+
+def lesson_due(lesson=Lesson):
+    """Scheduled lessons past their publish_at that the worker hasn't published yet."""
+    return db.and_(lesson.status == "scheduled", lesson.publish_at <= db.func.now(), lesson.thumbnails_ready)
+
+
+def live_lesson_arms(lesson=Lesson):
+    """Disjoint conditions covering the lessons in the catalog right now.
+
+    Published lessons match the partial indexes on status = 'published';
+    due ones (read-time publishing only) are few and found through the
+    worker's index. Queries that need an index use one arm per UNION branch.
+    """
+    arms = [lesson.status == "published"]
+    if READ_TIME_PUBLISHING:
+        arms.append(lesson_due(lesson))
+    return arms
+
+
+def live_lesson_sql(alias):
+    """live_lesson_arms as a raw SQL condition on a lessons alias."""
+    published = f"{alias}.status = 'published'"
+    if not READ_TIME_PUBLISHING:
+        return published
+    return f"({published} OR ({DUE_LESSON_SQL.format(l=alias)}))"
+
+
+def catalog_program_arms():
+    """Disjoint conditions covering the programs in the catalog right now.
+
+    Programs with published lessons come from the rollups (and the partial
+    indexes on them). With read-time publishing, programs whose only live
+    lessons are due ones make up a second, small arm.
+    """
+    arms = [Program.published_lesson_count > 0]
+    if READ_TIME_PUBLISHING:
+        arms.append(db.and_(
+            Program.published_lesson_count == 0,
+            Program.status != "archived",
+            Program.id.in_(db.select(Term.program_id).join(Lesson, Lesson.term_id == Term.id).where(lesson_due()))
+        ))
+    return arms
+
+
+def in_catalog():
+    return db.or_(*catalog_program_arms())
+
+
+# -----------------------
+# PROGRAM ROLLUPS
+# -----------------------
+
+# Recomputes the published-content rollups stored on each program.
+# The LATERAL aggregate always yields one row, so programs that lost
+# their last published lesson are reset to zero instead of skipped.
+# Archived programs count nothing, which takes them out of the catalog.
+# Only persisted state is counted: the listing and documents add due
+# lessons themselves under read-time publishing.
+REFRESH_ROLLUPS_SQL = """
+UPDATE programs AS p SET
+    published_term_count = s.term_count,
+    published_lesson_count = s.lesson_count,
+    published_duration_ms = s.duration_ms,
+    paid_lesson_count = s.paid_count,
+    free_lesson_count = s.lesson_count - s.paid_count
+FROM programs AS target
+CROSS JOIN LATERAL (
+    SELECT
+        COUNT(DISTINCT l.term_id) AS term_count,
+        COUNT(l.id) AS lesson_count,
+        COALESCE(SUM(l.duration_ms), 0) AS duration_ms,
+        COUNT(l.id) FILTER (WHERE l.is_paid) AS paid_count
+    FROM terms t
+    JOIN lessons l ON l.term_id = t.id AND l.status = 'published'
+    WHERE t.program_id = target.id AND target.status != 'archived'
+) AS s
+WHERE p.id = target.id
+"""
+
+
+def refresh_program_rollups(program_ids=None):
+    """Recompute rollups for the given programs (all programs when None).
+
+    Runs inside the caller's transaction; the caller commits.
+    """
+    if program_ids is None:
+        db.session.execute(db.text(REFRESH_ROLLUPS_SQL))
+        return
+
+    program_ids = [pid for pid in set(program_ids) if pid]
+    if not program_ids:
+        return
+
+    db.session.execute(
+        db.text(REFRESH_ROLLUPS_SQL + " AND target.id = ANY(CAST(:program_ids AS uuid[]))"),
+        {"program_ids": program_ids}
+    )
+
+
+def notify_programs_changed(program_ids):
+    """Queue a catalog_changed NOTIFY; Postgres delivers it on commit."""
+    for payload in notify_payloads(program_ids):
+        db.session.execute(
+            db.text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": CATALOG_CHANNEL, "payload": payload}
+        )
+
+
+def on_programs_changed(program_ids):
+    """Hook called before commit whenever published content of a program changes."""
+    # Canonical ids (URLs may carry any casing), so notifications match cache tags
+    program_ids = {parse_id(pid) for pid in program_ids if pid} - {None}
+    # The refresh below is raw SQL, which doesn't autoflush pending ORM changes
+    db.session.flush()
+    refresh_program_rollups(program_ids)
+    rebuild_program_documents(program_ids)
+    notify_programs_changed(program_ids)
+    pin_primary_reads()
+
+
+# -----------------------
+# CATALOG LISTING
+# -----------------------
+
+def pack_cursor(values):
+    raw = json.dumps(values).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def unpack_cursor(cursor):
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+    return json.loads(raw)
+
+
+def encode_cursor(program):
+    published_at = program.published_at.isoformat() if program.published_at else None
+    return pack_cursor([published_at, program.id])
+
+
+def cursor_id(value):
+    """The id stored in a cursor, checked before it's compared to a uuid column."""
+    value = parse_id(value)
+    if value is None:
+        raise CatalogQueryError("INVALID_CURSOR", "Cursor is malformed")
+    return value
+
+
+def decode_cursor(cursor):
+    try:
+        published_at, program_id = unpack_cursor(cursor)
+        if published_at is not None:
+            published_at = datetime.fromisoformat(published_at)
+    except (ValueError, TypeError):
+        raise CatalogQueryError("INVALID_CURSOR", "Cursor is malformed")
+    return published_at, cursor_id(program_id)
+
+
+def parse_limit(raw, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    if raw is None:
+        return default
+    try:
+        limit = int(raw)
+    except ValueError:
+        raise CatalogQueryError("INVALID_LIMIT", "limit must be an integer")
+    if limit < 1:
+        raise CatalogQueryError("INVALID_LIMIT", "limit must be at least 1")
+    return min(limit, maximum)
+
+
+def parse_topics(values):
+    """Topic ids from repeated ?topic= params, each optionally comma separated."""
+    topics = {topic.strip() for value in values for topic in value.split(",")}
+    return tuple(sorted(topic for topic in topics if topic))
+
+
+LISTING_COLUMNS = (
+    Program.id, Program.title, Program.language_primary, Program.status, Program.published_at,
+    Program.published_term_count, Program.published_lesson_count, Program.published_duration_ms,
+    Program.paid_lesson_count, Program.free_lesson_count
+)
+
+
+def due_rollups(program_ids):
+    """Totals of the due lessons of the given programs, to add to their stored rollups.
+
+    term_count only counts terms the rollups don't already have, i.e.
+    without a published lesson.
+    """
+    published = db.aliased(Lesson)
+    new_term = ~db.exists().where(published.term_id == Lesson.term_id, published.status == "published")
+    return (
+        db.select(
+            Term.program_id,
+            db.func.count(db.distinct(Lesson.term_id)).filter(new_term).label("term_count"),
+            db.func.count(Lesson.id).label("lesson_count"),
+            db.func.coalesce(db.func.sum(Lesson.duration_ms), 0).label("duration_ms"),
+            db.func.count(Lesson.id).filter(Lesson.is_paid).label("paid_count")
+        )
+        .join(Term, Lesson.term_id == Term.id)
+        .where(lesson_due(), Term.program_id.in_(program_ids))
+        .group_by(Term.program_id)
+        .subquery("due")
+    )
+
+
+def listing_filters(language_primary=None, status=None, topics=(), language=None, subtitle=None):
+    """WHERE clauses shared by the listing page and its topic facets.
+
+    Catalog membership itself is added per catalog_program_arms branch.
+    language matches programs offering that language; subtitle matches
+    programs with a live lesson subtitled in it. Both are JSONB
+    containment checks on GIN-indexed columns.
+    """
+    if status is not None and status not in PROGRAM_STATUSES:
+        raise CatalogQueryError("INVALID_STATUS", f"status must be one of {', '.join(PROGRAM_STATUSES)}")
+    if len(topics) > MAX_TOPIC_FILTERS:
+        raise CatalogQueryError("INVALID_TOPIC", f"at most {MAX_TOPIC_FILTERS} topics can be combined")
+
+    filters = []
+    if language_primary:
+        filters.append(Program.language_primary == language_primary)
+    if status:
+        filters.append(Program.status == status)
+    if language:
+        filters.append(Program.languages_available.contains([language]))
+    if subtitle:
+        filters.append(Program.id.in_(db.union_all(*(
+            db.select(Term.program_id)
+            .join(Lesson, Lesson.term_id == Term.id)
+            .where(live, Lesson.subtitle_languages.contains([subtitle]))
+            for live in live_lesson_arms()
+        ))))
+    if topics:
+        # Programs tagged with every requested topic
+        filters.append(Program.id.in_(
+            db.select(ProgramTopic.program_id)
+            .where(ProgramTopic.topic_id.in_(topics))
+            .group_by(ProgramTopic.program_id)
+            .having(db.func.count() == len(topics))
+        ))
+    return filters
+
+
+def listing_statement(limit=DEFAULT_PAGE_SIZE, cursor=None, **filters):
+    """SELECT for one listing page (limit + 1 rows, to detect a next page).
+
+    Ordered by (published_at DESC NULLS LAST, id DESC); the cursor holds the
+    last row's sort key so each page is a bounded index range scan.
+    filters are the keyword arguments of listing_filters. With read-time
+    publishing, each catalog_program_arms branch is paged on its own and
+    the branches merged (so the keyset index still bounds the scan), then
+    the page's due lessons are added to its counts.
+    """
+    conditions = listing_filters(**filters)
+
+    if cursor:
+        after_published_at, after_id = decode_cursor(cursor)
+        if after_published_at is None:
+            conditions += [Program.published_at.is_(None), Program.id < after_id]
+        else:
+            conditions.append(db.or_(
+                db.tuple_(Program.published_at, Program.id) < (after_published_at, after_id),
+                Program.published_at.is_(None)
+            ))
+
+    order = (Program.published_at.desc().nulls_last(), Program.id.desc())
+    if not READ_TIME_PUBLISHING:
+        # Plain column rows: the listing never hydrates Program objects
+        return db.select(*LISTING_COLUMNS).where(in_catalog(), *conditions).order_by(*order).limit(limit + 1)
+
+    page = db.union_all(*(
+        db.select(*LISTING_COLUMNS).where(arm, *conditions).order_by(*order).limit(limit + 1)
+        for arm in catalog_program_arms()
+    )).cte("page")
+    # Due lessons are counted for the page's programs only, in one pass
+    due = due_rollups(db.select(page.c.id))
+
+    def plus_due(column, due_total):
+        return (column + db.func.coalesce(due_total, 0)).label(column.name)
+
+    return (
+        db.select(
+            page.c.id, page.c.title, page.c.language_primary, page.c.status, page.c.published_at,
+            plus_due(page.c.published_term_count, due.c.term_count),
+            plus_due(page.c.published_lesson_count, due.c.lesson_count),
+            plus_due(page.c.published_duration_ms, due.c.duration_ms),
+            plus_due(page.c.paid_lesson_count, due.c.paid_count),
+            plus_due(page.c.free_lesson_count, due.c.lesson_count - due.c.paid_count)
+        )
+        .outerjoin(due, due.c.program_id == page.c.id)
+        .order_by(page.c.published_at.desc().nulls_last(), page.c.id.desc())
+        .limit(limit + 1)
+    )
+
+
+def topic_facets_statement(**filters):
+    """Per-topic counts of the programs matching the listing filters, in one aggregate.
+
+    Counts are for the whole filtered result, not the page, so each one is
+    what the listing would hold with that topic added to the filter.
+    """
+    conditions = listing_filters(**filters)
+    matching = db.union_all(*(db.select(Program.id).where(arm, *conditions) for arm in catalog_program_arms()))
+    program_count = db.func.count(ProgramTopic.program_id).label("program_count")
+
+    return (
+        db.select(Topic.id, Topic.name, program_count)
+        .join(ProgramTopic, ProgramTopic.topic_id == Topic.id)
+        .where(ProgramTopic.program_id.in_(matching))
+        .group_by(Topic.id, Topic.name)
+        .order_by(program_count.desc(), Topic.name)
+    )
+
+
+def listing_page(programs, limit, facets=()):
+    """Response body for the rows returned by listing_statement and topic_facets_statement."""
+    page = programs[:limit]
+    next_cursor = encode_cursor(page[-1]) if len(programs) > limit else None
+
+    return {
+        "data": [program_summary(program) for program in page],
+        "next_cursor": next_cursor,
+        "facets": {
+            "topics": [
+                {"id": topic.id, "name": topic.name, "count": topic.program_count}
+                for topic in facets
+            ]
+        }
+    }
+
+
+def list_programs(limit=DEFAULT_PAGE_SIZE, cursor=None, **filters):
+    """One page of catalog programs, newest first, with a keyset cursor and topic facets."""
+    statement = listing_statement(limit, cursor, **filters)
+    facets = topic_facets_statement(**filters)
+    return listing_page(db.session.execute(statement).all(), limit, db.session.execute(facets).all())
+
+
+def program_summary(program):
+    return {
+        "id": program.id,
+        "title": program.title,
+        "language_primary": program.language_primary,
+        "status": program.status,
+        "published_at": program.published_at.isoformat() if program.published_at else None,
+        "term_count": program.published_term_count,
+        "lesson_count": program.published_lesson_count,
+        "total_duration_ms": program.published_duration_ms,
+        "paid_lesson_count": program.paid_lesson_count,
+        "free_lesson_count": program.free_lesson_count
+    }
+
+
+# -----------------------
+# CATALOG DETAIL
+# -----------------------
+
+def pivot_assets(assets):
+    """Group asset rows into {language: {variant: url}}."""
+    result = {}
+    for asset in assets:
+        result.setdefault(asset.language, {})[asset.variant] = asset.url
+    return result
+
+
+def isoformat(value):
+    return value.isoformat() if value else None
+
+
+def lesson_payload(lesson, thumbnails):
+    return {
+        "id": lesson.id,
+        "term_id": lesson.term_id,
+        "lesson_number": lesson.lesson_number,
+        "title": lesson.title,
+        "content_type": lesson.content_type,
+        "duration_ms": lesson.duration_ms,
+        "is_paid": lesson.is_paid,
+        "content_language_primary": lesson.content_language_primary,
+        "content_languages_available": lesson.content_languages_available,
+        "content_urls_by_language": lesson.content_urls_by_language,
+        "subtitle_languages": lesson.subtitle_languages or [],
+        "subtitle_urls_by_language": lesson.subtitle_urls_by_language or {},
+        # Due lessons (read-time publishing) aren't stamped by the worker yet
+        "published_at": isoformat(lesson.published_at or due_since(lesson)),
+        "assets": {"thumbnails": thumbnails}
+    }
+
+
+def get_program_detail(program_id, session=None):
+    """Catalog program with its live terms, lessons and assets, or None. Four queries."""
+    return next(iter(get_program_details([program_id], session).values()), None)
+
+
+def get_program_details(program_ids, session=None):
+    """Catalog programs with their live terms, lessons and assets, by id.
+
+    Always four queries however many programs: programs, posters, live
+    terms+lessons, and thumbnails for all of those lessons at once.
+    Programs not in the catalog are left out. session defaults to
+    db.session (the async service passes its own).
+    """
+    session = session or db.session
+    # populate_existing: rollups may have just been updated with raw SQL
+    programs = session.query(Program).filter(
+        Program.id.in_(program_ids),
+        in_catalog()
+    ).populate_existing().all()
+    if not programs:
+        return {}
+    ids = [program.id for program in programs]
+
+    posters_by_program = {}
+    for asset in session.query(ProgramAsset).filter(
+        ProgramAsset.program_id.in_(ids), ProgramAsset.asset_type == "poster"
+    ):
+        posters_by_program.setdefault(asset.program_id, []).append(asset)
+
+    # populate_existing too: readiness (ready_at) is refreshed with raw SQL
+    rows = session.query(Term, Lesson).join(Lesson, Lesson.term_id == Term.id).filter(
+        Term.program_id.in_(ids),
+        db.or_(*live_lesson_arms())
+    ).order_by(Term.term_number, Lesson.lesson_number).populate_existing().all()
+
+    thumbnails_by_lesson = {}
+    if rows:
+        thumbnails = session.query(LessonAsset).filter(
+            LessonAsset.lesson_id.in_([lesson.id for _, lesson in rows]),
+            LessonAsset.asset_type == "thumbnail"
+        ).all()
+        for asset in thumbnails:
+            thumbnails_by_lesson.setdefault(asset.lesson_id, []).append(asset)
+
+    rows_by_program = {}
+    for term, lesson in rows:
+        rows_by_program.setdefault(term.program_id, []).append((term, lesson))
+
+    return {
+        program.id: program_detail(
+            program, posters_by_program.get(program.id, []), rows_by_program.get(program.id, []),
+            thumbnails_by_lesson
+        )
+        for program in programs
+    }
+
+
+def program_detail(program, posters, rows, thumbnails_by_lesson):
+    """Detail payload of one program from its posters and (term, lesson) rows."""
+    terms = []
+    for term, lesson in rows:
+        if not terms or terms[-1]["id"] != term.id:
+            terms.append({
+                "id": term.id,
+                "term_number": term.term_number,
+                "title": term.title,
+                "lessons": []
+            })
+        terms[-1]["lessons"].append(
+            lesson_payload(lesson, pivot_assets(thumbnails_by_lesson.get(lesson.id, [])))
+        )
+
+    detail = program_summary(program)
+    if READ_TIME_PUBLISHING:
+        # The rollups don't count due lessons yet; these rows do
+        lessons = [lesson for _, lesson in rows]
+        paid = sum(1 for lesson in lessons if lesson.is_paid)
+        detail.update({
+            "term_count": len(terms),
+            "lesson_count": len(lessons),
+            "total_duration_ms": sum(lesson.duration_ms or 0 for lesson in lessons),
+            "paid_lesson_count": paid,
+            "free_lesson_count": len(lessons) - paid
+        })
+    detail.update({
+        "description": program.description,
+        "languages_available": program.languages_available,
+        "assets": {"posters": pivot_assets(posters)},
+        "terms": terms
+    })
+    return detail
+
+
+def get_lesson_detail(lesson_id, session=None):
+    """Live lesson of a catalog program with its thumbnails, or None. Two queries."""
+    session = session or db.session
+    row = session.query(Lesson, Term.program_id).join(Term, Lesson.term_id == Term.id).join(
+        Program, Term.program_id == Program.id
+    ).filter(
+        Lesson.id == lesson_id,
+        db.or_(*live_lesson_arms()),
+        in_catalog()
+    ).populate_existing().first()
+    if not row:
+        return None
+
+    lesson, program_id = row
+    thumbnails = session.query(LessonAsset).filter_by(lesson_id=lesson.id, asset_type="thumbnail").all()
+
+    detail = lesson_payload(lesson, pivot_assets(thumbnails))
+    detail["program_id"] = program_id
+    return detail
+
+
+# -----------------------
+# CATALOG UI TREE
+# -----------------------
+
+# Rows fetched per round trip from the server-side cursor
+CATALOG_UI_FETCH_SIZE = 500
+
+
+def iter_catalog_tree(fetch_size=CATALOG_UI_FETCH_SIZE):
+    """Yield each catalog program as a nested dict, in listing order.
+
+    One query over programs, terms and live lessons, read through a
+    server-side cursor and grouped as it streams, so memory is bounded by
+    the largest single program rather than the whole catalog.
+    """
+    rows = db.session.execute(
+        db.select(
+            Program.id, Program.title,
+            Term.term_number, Term.title.label("term_title"),
+            Lesson.lesson_number, Lesson.title.label("lesson_title")
+        )
+        .join(Term, Term.program_id == Program.id)
+        .join(Lesson, db.and_(Lesson.term_id == Term.id, db.or_(*live_lesson_arms())))
+        .where(in_catalog())
+        .order_by(
+            Program.published_at.desc().nulls_last(), Program.id.desc(),
+            Term.term_number, Lesson.lesson_number
+        )
+        .execution_options(yield_per=fetch_size)
+    )
+
+    for _, program_rows in groupby(rows, key=lambda row: row.id):
+        program = None
+        for row in program_rows:
+            if program is None:
+                program = {"id": row.id, "title": row.title, "terms": []}
+            terms = program["terms"]
+            if not terms or terms[-1]["term_number"] != row.term_number:
+                terms.append({"term_number": row.term_number, "title": row.term_title, "lessons": []})
+            terms[-1]["lessons"].append({"lesson_number": row.lesson_number, "title": row.lesson_title})
+        yield program
+
+
+# -----------------------
+# CATALOG DOCUMENTS
+# -----------------------
+
+def serialize(payload):
+    return json.dumps(payload, separators=(",", ":"), sort_keys=True)
+
+
+# Id of the writing transaction, as a plain integer (see list_changes)
+CURRENT_XID = db.literal_column("pg_current_xact_id()::text::bigint")
+
+
+def record_changes(entity_type, entities, deleted=False):
+    """Stamp change-feed rows for (entity_id, program_id) pairs changed in this transaction."""
+    if not entities:
+        return
+
+    now = datetime.utcnow()
+    stmt = insert(CatalogChange).values([
+        {
+            "entity_type": entity_type,
+            "entity_id": entity_id,
+            "program_id": program_id,
+            "change_xid": CURRENT_XID,
+            "changed_at": now,
+            "deleted": deleted
+        }
+        for entity_id, program_id in entities
+    ])
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=[CatalogChange.entity_type, CatalogChange.entity_id],
+        set_={
+            "program_id": stmt.excluded.program_id,
+            "change_xid": stmt.excluded.change_xid,
+            "changed_at": stmt.excluded.changed_at,
+            "deleted": stmt.excluded.deleted
+        }
+    ))
+
+
+def rebuild_program_documents(program_ids):
+    """Re-render the stored catalog documents for the given programs.
+
+    Writes one JSON document per catalog program plus one per live
+    lesson, and removes documents for programs and lessons that are no
+    longer in the catalog. Documents whose content actually changed (and
+    removals, as tombstones) are recorded in the change feed. Under
+    read-time publishing, program documents also get their expires_at.
+    Runs inside the caller's transaction.
+    """
+    for program_id in {pid for pid in program_ids if pid}:
+        detail = get_program_detail(program_id)
+        lesson_rows = [
+            {
+                "lesson_id": lesson["id"],
+                "program_id": program_id,
+                "document": serialize(dict(lesson, program_id=program_id))
+            }
+            for term in (detail["terms"] if detail else [])
+            for lesson in term["lessons"]
+        ]
+
+        removed = db.session.execute(
+            db.delete(CatalogLessonDocument).where(
+                CatalogLessonDocument.program_id == program_id,
+                CatalogLessonDocument.lesson_id.not_in([row["lesson_id"] for row in lesson_rows])
+            ).returning(CatalogLessonDocument.lesson_id)
+        ).scalars().all()
+        record_changes("lesson", [(lesson_id, program_id) for lesson_id in removed], deleted=True)
+
+        if detail is None:
+            removed = db.session.execute(
+                db.delete(CatalogDocument).where(CatalogDocument.program_id == program_id)
+                .returning(CatalogDocument.program_id)
+            ).scalars().all()
+            record_changes("program", [(pid, pid) for pid in removed], deleted=True)
+            continue
+
+        # Upserts skip (and don't return) rows whose document is unchanged
+        stmt = insert(CatalogDocument).values(
+            program_id=program_id,
+            document=serialize(detail),
+            built_at=datetime.utcnow()
+        )
+        changed = db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[CatalogDocument.program_id],
+            set_={"document": stmt.excluded.document, "built_at": stmt.excluded.built_at},
+            where=CatalogDocument.document != stmt.excluded.document
+        ).returning(CatalogDocument.program_id)).scalars().all()
+        record_changes("program", [(pid, pid) for pid in changed])
+
+        if lesson_rows:
+            stmt = insert(CatalogLessonDocument).values(lesson_rows)
+            changed = db.session.execute(stmt.on_conflict_do_update(
+                index_elements=[CatalogLessonDocument.lesson_id],
+                set_={"document": stmt.excluded.document, "program_id": stmt.excluded.program_id},
+                where=CatalogLessonDocument.document != stmt.excluded.document
+            ).returning(CatalogLessonDocument.lesson_id)).scalars().all()
+            record_changes("lesson", [(lesson_id, program_id) for lesson_id in changed])
+
+    if READ_TIME_PUBLISHING:
+        refresh_document_expiry(program_ids)
+
+
+def refresh_document_expiry(program_ids):
+    """Stamp each program document with its next go-live, when it stops being current."""
+    next_go_live = (
+        db.select(db.func.min(Lesson.publish_at))
+        .join(Term, Lesson.term_id == Term.id)
+        .where(
+            Term.program_id == CatalogDocument.program_id,
+            Lesson.status == "scheduled", Lesson.thumbnails_ready, Lesson.publish_at > db.func.now()
+        )
+        .scalar_subquery()
+    )
+    db.session.execute(
+        db.update(CatalogDocument)
+        .where(CatalogDocument.program_id.in_({pid for pid in program_ids if pid}))
+        .values(expires_at=next_go_live)
+    )
+
+
+def rebuild_all_documents(batch_size=100):
+    """Rebuild every catalog document, committing per batch (recovery)."""
+    catalog_ids = db.select(Program.id).where(in_catalog())
+    stale = db.session.execute(
+        db.select(CatalogDocument.program_id).where(CatalogDocument.program_id.not_in(catalog_ids))
+        .union(
+            db.select(CatalogLessonDocument.program_id).where(CatalogLessonDocument.program_id.not_in(catalog_ids))
+        )
+    ).scalars().all()
+    program_ids = stale + db.session.execute(catalog_ids).scalars().all()
+
+    for start in range(0, len(program_ids), batch_size):
+        rebuild_program_documents(program_ids[start:start + batch_size])
+        db.session.commit()
+
+    return len(program_ids) - len(stale)
+
+
+# Programs whose stored document is out of date (read-time publishing):
+# expired at a go-live that has passed, or missing though a lesson is due
+EXPORT_STALE_SQL = f"""
+SELECT program_id::text FROM catalog_documents WHERE expires_at <= now()
+UNION
+SELECT t.program_id::text
+FROM lessons l
+JOIN terms t ON t.id = l.term_id
+LEFT JOIN catalog_documents d ON d.program_id = t.program_id
+WHERE {DUE_LESSON_SQL.format(l="l")} AND d.program_id IS NULL
+"""
+
+
+def export_documents(fetch_size=CATALOG_UI_FETCH_SIZE):
+    """Every catalog program document (JSON text), in program id order.
+
+    Stored documents are read through a server-side cursor, so a full
+    export is one pass with flat memory however large the catalog is.
+    Under read-time publishing, out-of-date documents are rendered live
+    instead, like program_document does: all of them at once, in at most
+    five more queries (only a handful while the listener keeps up).
+    """
+    query = db.select(CatalogDocument.program_id, CatalogDocument.document)
+    rendered = []
+    if READ_TIME_PUBLISHING:
+        query = query.where(document_is_current())
+        stale = db.session.execute(db.text(EXPORT_STALE_SQL)).scalars().all()
+        if stale:
+            rendered = sorted(
+                (program_id, serialize(detail)) for program_id, detail in get_program_details(stale).items()
+            )
+
+    stored = db.session.execute(
+        query.order_by(CatalogDocument.program_id).execution_options(yield_per=fetch_size)
+    )
+    # Canonical uuid strings sort as Postgres orders uuids
+    return (document for _, document in heapq.merge(stored, rendered, key=lambda row: row[0]))
+
+
+# Claims queued programs so that only one API process rebuilds each.
+CLAIM_REBUILDS_SQL = """
+DELETE FROM catalog_rebuild_queue
+WHERE program_id IN (
+    SELECT program_id FROM catalog_rebuild_queue
+    ORDER BY queued_at
+    LIMIT :limit
+    FOR UPDATE SKIP LOCKED
+)
+RETURNING program_id::text
+"""
+
+
+def drain_rebuild_queue(batch_size=50):
+    """Rebuild documents for programs queued by the worker."""
+    while True:
+        program_ids = db.session.execute(
+            db.text(CLAIM_REBUILDS_SQL), {"limit": batch_size}
+        ).scalars().all()
+        if not program_ids:
+            db.session.commit()
+            return
+
+        rebuild_program_documents(program_ids)
+        notify_programs_changed(program_ids)
+        db.session.commit()
+
+
+# Programs with a due lesson their document was rendered without (it
+# expired at or before that lesson's publish_at), or without a document
+# yet. Sorted, so concurrent API processes lock programs in one order.
+GONE_LIVE_SQL = f"""
+SELECT DISTINCT t.program_id::text
+FROM lessons l
+JOIN terms t ON t.id = l.term_id
+JOIN programs p ON p.id = t.program_id AND p.status != 'archived'
+LEFT JOIN catalog_documents d ON d.program_id = t.program_id
+WHERE {DUE_LESSON_SQL.format(l="l")}
+  AND (d.program_id IS NULL OR d.expires_at <= l.publish_at)
+ORDER BY 1
+"""
+
+# Seconds until the next publishable scheduled lesson goes live, or NULL
+NEXT_GO_LIVE_SQL = """
+SELECT EXTRACT(EPOCH FROM (MIN(publish_at)::timestamptz - now()))
+FROM lessons
+WHERE status = 'scheduled' AND has_portrait_thumbnail AND has_landscape_thumbnail
+  AND publish_at > now()
+"""
+
+
+def rebuild_gone_live_documents():
+    """Re-render documents of programs whose lessons just went live (read-time publishing).
+
+    Runs on the cache listener thread at each go-live, so documents, the
+    change feed and other processes' caches catch up without the worker.
+    Returns seconds until the next go-live, or None if nothing is scheduled.
+    """
+    program_ids = db.session.execute(db.text(GONE_LIVE_SQL)).scalars().all()
+    if program_ids:
+        rebuild_program_documents(program_ids)
+        notify_programs_changed(program_ids)
+    delay = db.session.execute(db.text(NEXT_GO_LIVE_SQL)).scalar()
+    db.session.commit()
+    return None if delay is None else float(delay)
+
+
+def document_is_current():
+    # Not rendered before a go-live that has since passed (read-time publishing)
+    return db.or_(CatalogDocument.expires_at.is_(None), CatalogDocument.expires_at > db.func.now())
+
+
+def program_document_statement(program_id):
+    query = db.select(CatalogDocument.document).where(CatalogDocument.program_id == program_id)
+    if READ_TIME_PUBLISHING:
+        query = query.where(document_is_current())
+    return query
+
+
+def lesson_document_statement(lesson_id):
+    return db.select(
+        CatalogLessonDocument.program_id, CatalogLessonDocument.document
+    ).where(CatalogLessonDocument.lesson_id == lesson_id)
+
+
+def render_program_document(program_id, session=None):
+    """Fallback for program_document_statement misses under read-time publishing.
+
+    Renders the document live while the stored one is out of date (until
+    rebuild_gone_live_documents catches up), or None if the program isn't
+    in the catalog.
+    """
+    if not READ_TIME_PUBLISHING:
+        return None
+    detail = get_program_detail(program_id, session)
+    return serialize(detail) if detail else None
+
+
+def render_lesson_document(lesson_id, session=None):
+    """(program_id, JSON) fallback for lesson_document_statement misses, like render_program_document."""
+    if not READ_TIME_PUBLISHING:
+        return None
+    detail = get_lesson_detail(lesson_id, session)
+    return (detail["program_id"], serialize(detail)) if detail else None
+
+
+def program_document(program_id):
+    """Stored JSON for a catalog program, or None. One primary-key lookup.
+
+    Under read-time publishing, an out-of-date or missing document is
+    rendered live instead (four more queries).
+    """
+    document = db.session.execute(program_document_statement(program_id)).scalar()
+    return document or render_program_document(program_id)
+
+
+def lesson_document(lesson_id):
+    """(program_id, JSON) for a live lesson, or None. One primary-key lookup.
+
+    Under read-time publishing, a due lesson without a document yet is
+    rendered live (two more queries).
+    """
+    return db.session.execute(lesson_document_statement(lesson_id)).first() or render_lesson_document(lesson_id)
+
+
+# -----------------------
+# CHANGE FEED
+# -----------------------
+
+CHANGES_PAGE_SIZE = 100
+MAX_CHANGES_PAGE_SIZE = 1000
+
+# Changes in (change_xid, entity_type, entity_id) order after the cursor,
+# limited to transactions older than every one still running: those can
+# no longer commit, so nothing can appear behind a cursor once handed out.
+CHANGES_SQL = """
+SELECT c.entity_type, c.entity_id::text AS entity_id, c.program_id::text AS program_id,
+       c.change_xid, c.changed_at, c.deleted,
+       COALESCE(p.document, l.document) AS document
+FROM catalog_changes c
+LEFT JOIN catalog_documents p ON c.entity_type = 'program' AND p.program_id = c.entity_id
+LEFT JOIN catalog_lesson_documents l ON c.entity_type = 'lesson' AND l.lesson_id = c.entity_id
+WHERE (c.change_xid, c.entity_type, c.entity_id) > (:xid, :entity_type, :entity_id)
+  AND c.change_xid < pg_snapshot_xmin(pg_current_snapshot())::text::bigint
+ORDER BY c.change_xid, c.entity_type, c.entity_id
+LIMIT :limit
+"""
+
+START_OF_FEED = [0, "", NIL_ID]
+
+
+def decode_change_cursor(cursor):
+    if not cursor:
+        return START_OF_FEED
+    try:
+        xid, entity_type, entity_id = unpack_cursor(cursor)
+        xid, entity_type = int(xid), str(entity_type)
+    except (ValueError, TypeError):
+        raise CatalogQueryError("INVALID_CURSOR", "Cursor is malformed")
+    return [xid, entity_type, cursor_id(entity_id)]
+
+
+def list_changes(since=None, limit=CHANGES_PAGE_SIZE):
+    """Catalog entities changed after the since cursor, oldest change first.
+
+    Each entry carries the entity's current public document, or
+    deleted=true (a tombstone) when it left the catalog. next_cursor is
+    always returned; passing it back resumes exactly after this page.
+    """
+    xid, entity_type, entity_id = decode_change_cursor(since)
+    rows = db.session.execute(db.text(CHANGES_SQL), {
+        "xid": xid, "entity_type": entity_type, "entity_id": entity_id, "limit": limit + 1
+    }).all()
+
+    page = rows[:limit]
+    last = [page[-1].change_xid, page[-1].entity_type, page[-1].entity_id] if page else [xid, entity_type, entity_id]
+
+    return {
+        "data": [
+            {
+                "type": row.entity_type,
+                "id": row.entity_id,
+                "program_id": row.program_id,
+                "changed_at": isoformat(row.changed_at),
+                "deleted": row.deleted,
+                "document": json.loads(row.document) if row.document and not row.deleted else None
+            }
+            for row in page
+        ],
+        "next_cursor": pack_cursor(last),
+        "has_more": len(rows) > limit
+    }
+
+
+# -----------------------
+# CATALOG SEARCH
+# -----------------------
+
+MAX_QUERY_LENGTH = 200
+
+# Matches in catalog programs and their live lessons, best first.
+# The first two arms filter on the predicates of the partial GIN indexes
+# ix_programs_search / ix_lessons_search so the planner can use them;
+# {due_arms} adds DUE_SEARCH_SQL under read-time publishing.
+# Ids are paged on as uuids and returned as text.
+SEARCH_SQL = """
+SELECT type, id::text AS id, program_id::text AS program_id, title, language, rank FROM (
+    SELECT 'program' AS type, p.id, p.id AS program_id, p.title, p.language_primary AS language,
+           ts_rank_cd(p.search_vector, {query})::float8 AS rank
+    FROM programs p
+    WHERE p.published_lesson_count > 0
+      AND p.search_vector @@ {query} {program_filters}
+    UNION ALL
+    SELECT 'lesson', l.id, t.program_id, l.title, l.content_language_primary,
+           ts_rank_cd(l.search_vector, {query})::float8
+    FROM lessons l
+    JOIN terms t ON t.id = l.term_id
+    JOIN programs p ON p.id = t.program_id
+    WHERE l.status = 'published' AND p.published_lesson_count > 0
+      AND l.search_vector @@ {query} {lesson_filters}
+    {due_arms}
+) AS hits
+{after}
+ORDER BY rank DESC, type DESC, hits.id DESC
+LIMIT :limit
+"""
+
+# Programs whose only live lessons are due, and the due lessons
+# themselves: both found through the due lessons' index, then matched.
+DUE_SEARCH_SQL = """
+    UNION ALL
+    SELECT 'program', p.id, p.id, p.title, p.language_primary,
+           ts_rank_cd(p.search_vector, {query})::float8
+    FROM programs p
+    WHERE p.published_lesson_count = 0 AND p.status != 'archived'
+      AND p.id IN (SELECT dt.program_id FROM lessons dl JOIN terms dt ON dt.id = dl.term_id WHERE {due_dl})
+      AND p.search_vector @@ {query} {program_filters}
+    UNION ALL
+    SELECT 'lesson', l.id, t.program_id, l.title, l.content_language_primary,
+           ts_rank_cd(l.search_vector, {query})::float8
+    FROM lessons l
+    JOIN terms t ON t.id = l.term_id
+    JOIN programs p ON p.id = t.program_id
+    WHERE {due_l} AND p.status != 'archived'
+      AND l.search_vector @@ {query} {lesson_filters}
+"""
+
+
+def search_query_sql(lang):
+    """tsquery for :q parsed like the content it should match.
+
+    Rows are indexed with their own language's config, so without a lang
+    the query is parsed with every config and the distinct results OR'd
+    together (one InitPlan, so the GIN scan sees a single tsquery).
+    """
+    if lang:
+        return f"websearch_to_tsquery('{SEARCH_CONFIGS.get(lang, 'simple')}', :q)"
+
+    configs = ", ".join(f"'{config}'" for config in sorted(set(SEARCH_CONFIGS.values())) + ["simple"])
+    return (
+        "(SELECT coalesce(string_agg(DISTINCT '(' || query::text || ')', ' | '), '')::tsquery "
+        f"FROM unnest(ARRAY[{configs}]::regconfig[]) AS config, "
+        "websearch_to_tsquery(config, :q) AS query WHERE numnode(query) > 0)"
+    )
+
+
+def decode_search_cursor(cursor):
+    try:
+        rank, result_type, result_id = unpack_cursor(cursor)
+        rank, result_type = float(rank), str(result_type)
+    except (ValueError, TypeError):
+        raise CatalogQueryError("INVALID_CURSOR", "Cursor is malformed")
+    return rank, result_type, cursor_id(result_id)
+
+
+def search_statement(q, lang=None, limit=DEFAULT_PAGE_SIZE, cursor=None, language=None, subtitle=None):
+    """Ranked full-text search over live catalog content (limit + 1 rows).
+
+    lang restricts results to that content language and stems the query
+    with its config. language / subtitle keep lessons available in (or
+    subtitled in) that language, and programs offering it. Paged by
+    keyset on (rank, type, id).
+    """
+    q = (q or "").strip()
+    if not q:
+        raise CatalogQueryError("INVALID_QUERY", "q is required")
+    if len(q) > MAX_QUERY_LENGTH:
+        raise CatalogQueryError("INVALID_QUERY", f"q must be at most {MAX_QUERY_LENGTH} characters")
+
+    params = {"q": q, "limit": limit + 1}
+    program_filters, lesson_filters = [], []
+    if lang:
+        params["lang"] = lang
+        program_filters.append("p.language_primary = :lang")
+        lesson_filters.append("l.content_language_primary = :lang")
+    if language:
+        params["language"] = json.dumps([language])
+        program_filters.append("p.languages_available @> CAST(:language AS jsonb)")
+        lesson_filters.append("l.content_languages_available @> CAST(:language AS jsonb)")
+    if subtitle:
+        params["subtitle"] = json.dumps([subtitle])
+        program_filters.append(
+            "EXISTS (SELECT 1 FROM terms st JOIN lessons sl ON sl.term_id = st.id "
+            f"WHERE st.program_id = p.id AND {live_lesson_sql('sl')} "
+            "AND sl.subtitle_languages @> CAST(:subtitle AS jsonb))"
+        )
+        lesson_filters.append("l.subtitle_languages @> CAST(:subtitle AS jsonb)")
+
+    after = ""
+    if cursor:
+        params["rank"], params["type"], params["id"] = decode_search_cursor(cursor)
+        after = "WHERE (rank, type, hits.id) < (:rank, :type, CAST(:id AS uuid))"
+
+    parts = dict(
+        query=search_query_sql(lang),
+        program_filters="".join(f"AND {condition} " for condition in program_filters),
+        lesson_filters="".join(f"AND {condition} " for condition in lesson_filters)
+    )
+    due_arms = ""
+    if READ_TIME_PUBLISHING:
+        due_arms = DUE_SEARCH_SQL.format(
+            due_dl=DUE_LESSON_SQL.format(l="dl"), due_l=DUE_LESSON_SQL.format(l="l"), **parts
+        )
+    sql = SEARCH_SQL.format(due_arms=due_arms, after=after, **parts)
+    return db.text(sql).bindparams(**params)
+
+
+def search_page(rows, limit):
+    """Response body for the rows returned by search_statement."""
+    page = rows[:limit]
+    next_cursor = pack_cursor([page[-1].rank, page[-1].type, page[-1].id]) if len(rows) > limit else None
+
+    return {
+        "data": [
+            {
+                "type": row.type,
+                "id": row.id,
+                "program_id": row.program_id,
+                "title": row.title,
+                "language": row.language,
+                "rank": row.rank
+            }
+            for row in page
+        ],
+        "next_cursor": next_cursor
+    }
+
+
+def search_catalog(q, lang=None, limit=DEFAULT_PAGE_SIZE, cursor=None, language=None, subtitle=None):
+    """One page of catalog search results."""
+    statement = search_statement(q, lang, limit, cursor, language, subtitle)
+    return search_page(db.session.execute(statement).all(), limit)
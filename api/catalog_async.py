@@ -0,0 +1,187 @@
+"""Async serving mode for the public catalog API (ASGI).
+
+Serves the same /catalog/* endpoints and response shapes as the Flask
+app, but on asyncio with an asyncpg-backed SQLAlchemy session, so a DB
+wait no longer holds a thread. It runs as its own process next to the
+Flask admin app, and like it rebuilds the documents the worker queues:
+
+    uvicorn catalog_async:app --host 0.0.0.0 --port 8000
+"""
+import os
+import time
+from contextlib import asynccontextmanager
+from functools import wraps
+
+from prometheus_client import CONTENT_TYPE_LATEST
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from app import start_rebuild_consumer
+from db import pool_options
+from catalog import (
+    CatalogQueryError, lesson_document_statement, listing_page, listing_statement,
+    parse_limit, parse_topics, program_document_statement, render_lesson_document,
+    render_program_document, search_page, search_statement, serialize, topic_facets_statement
+)
+from metrics import REQUEST_LATENCY, metrics_payload
+
+
+def catalog_database_url():
+    """CATALOG_DATABASE_URL, else the replica, else the primary, on the asyncpg driver."""
+    url = (
+        os.getenv("CATALOG_DATABASE_URL")
+        or os.getenv("REPLICA_DATABASE_URL")
+        or os.getenv("DATABASE_URL")
+    )
+    return make_url(url).set(drivername="postgresql+asyncpg")
+
+
+def async_engine_options(prefix):
+    """pool_options plus asyncpg's spelling of the statement and connect timeouts."""
+    options = pool_options(prefix)
+
+    connect_args = {}
+    statement_timeout = os.getenv(f"{prefix}_STATEMENT_TIMEOUT_MS")
+    if statement_timeout:
+        connect_args["server_settings"] = {"statement_timeout": str(int(statement_timeout))}
+    connect_timeout = os.getenv(f"{prefix}_CONNECT_TIMEOUT")
+    if connect_timeout:
+        connect_args["timeout"] = float(connect_timeout)
+    if connect_args:
+        options["connect_args"] = connect_args
+    return options
+
+
+engine = create_async_engine(catalog_database_url(), **async_engine_options("CATALOG_DB"))
+Session = async_sessionmaker(engine, expire_on_commit=False)
+
+
+def json_response(payload, status_code=200):
+    return Response(serialize(payload), status_code=status_code, media_type="application/json")
+
+
+def error(code, message, status_code):
+    return json_response({"code": code, "message": message}, status_code)
+
+
+def timed(rule):
+    """Record request latency under the same endpoint labels as the Flask app."""
+    def decorator(endpoint):
+        @wraps(endpoint)
+        async def wrapper(request):
+            started = time.perf_counter()
+            response = await endpoint(request)
+            REQUEST_LATENCY.labels(rule, request.method, response.status_code).observe(
+                time.perf_counter() - started
+            )
+            return response
+        return wrapper
+    return decorator
+
+
+# -------------------------------
+# PUBLIC CATALOG API (READ-ONLY)
+# -------------------------------
+
+@timed("/catalog/programs")
+async def list_catalog_programs(request):
+    args = request.query_params
+    try:
+        limit = parse_limit(args.get("limit"))
+        filters = dict(
+            language_primary=args.get("language_primary"),
+            status=args.get("status"),
+            topics=parse_topics(args.getlist("topic")),
+            language=args.get("language"),
+            subtitle=args.get("subtitle")
+        )
+        statement = listing_statement(limit, args.get("cursor"), **filters)
+        facets_statement = topic_facets_statement(**filters)
+    except CatalogQueryError as e:
+        return error(e.code, e.message, 400)
+
+    async with Session() as session:
+        programs = (await session.execute(statement)).all()
+        facets = (await session.execute(facets_statement)).all()
+
+    return json_response(listing_page(programs, limit, facets))
+
+
+@timed("/catalog/search")
+async def search_catalog_content(request):
+    args = request.query_params
+    try:
+        limit = parse_limit(args.get("limit"))
+        statement = search_statement(
+            args.get("q"), args.get("lang"), limit, args.get("cursor"),
+            args.get("language"), args.get("subtitle")
+        )
+    except CatalogQueryError as e:
+        return error(e.code, e.message, 400)
+
+    async with Session() as session:
+        rows = (await session.execute(statement)).all()
+
+    return json_response(search_page(rows, limit))
+
+
+@timed("/catalog/programs/<program_id>")
+async def get_catalog_program(request):
+    program_id = request.path_params["program_id"]
+    async with Session() as session:
+        document = (await session.execute(program_document_statement(program_id))).scalar()
+        if not document:
+            # Out-of-date under read-time publishing: rendered live, as the Flask app does
+            document = await session.run_sync(lambda sync: render_program_document(program_id, sync))
+
+    if not document:
+        return error("NOT_FOUND", "Program not found", 404)
+
+    return Response(document, media_type="application/json")
+
+
+@timed("/catalog/lessons/<lesson_id>")
+async def get_catalog_lesson(request):
+    lesson_id = request.path_params["lesson_id"]
+    async with Session() as session:
+        row = (await session.execute(lesson_document_statement(lesson_id))).first()
+        if not row:
+            row = await session.run_sync(lambda sync: render_lesson_document(lesson_id, sync))
+
+    if not row:
+        return error("NOT_FOUND", "Lesson not found", 404)
+
+    return Response(row[1], media_type="application/json")
+
+
+async def health(request):
+    return JSONResponse({"status": "ok"})
+
+
+async def metrics(request):
+    return Response(metrics_payload(), media_type=CONTENT_TYPE_LATEST)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Serves stored documents, so drain the worker's rebuild queue here too
+    # (a thread on the primary, DATABASE_URL); no Flask process is needed
+    start_rebuild_consumer()
+    yield
+    await engine.dispose()
+
+
+app = Starlette(
+    routes=[
+        Route("/catalog/programs", list_catalog_programs, methods=["GET"]),
+        Route("/catalog/search", search_catalog_content, methods=["GET"]),
+        Route("/catalog/programs/{program_id}", get_catalog_program, methods=["GET"]),
+        Route("/catalog/lessons/{lesson_id}", get_catalog_lesson, methods=["GET"]),
+        Route("/health", health),
+        Route("/metrics", metrics),
+    ],
+    lifespan=lifespan
+)
@@ -1,3 +1,122 @@
+import os
+import time
+from functools import wraps
+
+from flask import current_app, g, has_request_context, session
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy.exc import OperationalError
+
+from metrics import DB_READ_ROUTES
+
+REPLICA_BIND = "replica"
+
+# How long reads stay on the primary after a catalog change, so a lagging
+# replica can't serve (or seed the cache with) content older than the change
+REPLICA_CATCHUP_SECONDS = float(os.getenv("REPLICA_CATCHUP_SECONDS", "5"))
+# How long to stop trying the replica after a failed read
+REPLICA_RETRY_SECONDS = float(os.getenv("REPLICA_RETRY_SECONDS", "30"))
+
+_primary_until = 0.0
+_replica_down_until = 0.0
+
+
+def pool_options(prefix):
+    """Connection pool settings for one database role, from <prefix>_* env vars."""
+    return {
+        "pool_size": int(os.getenv(f"{prefix}_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv(f"{prefix}_MAX_OVERFLOW", "10")),
+        "pool_timeout": float(os.getenv(f"{prefix}_POOL_TIMEOUT", "30")),
+        "pool_recycle": int(os.getenv(f"{prefix}_POOL_RECYCLE", "-1")),
+        "pool_pre_ping": os.getenv(f"{prefix}_POOL_PRE_PING", "true").lower() == "true",
+    }
+
+
+def engine_options(prefix, connect_timeout=None):
+    """Pool and timeout settings (psycopg2) for one database role, from <prefix>_* env vars."""
+    options = pool_options(prefix)
+
+    connect_args = {}
+    statement_timeout = os.getenv(f"{prefix}_STATEMENT_TIMEOUT_MS")
+    if statement_timeout:
+        connect_args["options"] = f"-c statement_timeout={int(statement_timeout)}"
+    connect_timeout = os.getenv(f"{prefix}_CONNECT_TIMEOUT", connect_timeout)
+    if connect_timeout:
+        connect_args["connect_timeout"] = int(connect_timeout)
+    if connect_args:
+        options["connect_args"] = connect_args
+    return options
+
+
+class RoutingSession(Session):
+    """Sends statements to the replica bind while a request has opted in."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_request_context() and g.get("use_replica"):
+            return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+
+
+# -----------------------
+# READ-REPLICA ROUTING
+# -----------------------
+
+def hold_primary_reads():
+    """Keep this process's catalog reads on the primary for a moment (called on every catalog_changed)."""
+    global _primary_until
+    _primary_until = time.monotonic() + REPLICA_CATCHUP_SECONDS
+
+
+def pin_primary_reads():
+    """Read-your-writes: keep this client's reads on the primary after it changes the catalog."""
+    if has_request_context():
+        session["read_primary_until"] = time.time() + REPLICA_CATCHUP_SECONDS
+
+
+def replica_available():
+    if REPLICA_BIND not in current_app.config.get("SQLALCHEMY_BINDS", {}):
+        return False
+    now = time.monotonic()
+    if now < _primary_until or now < _replica_down_until:
+        return False
+    return session.get("read_primary_until", 0) < time.time()
+
+
+def read_from_replica(read):
+    """Call read() with the session routed to the replica when one is configured.
+
+    Falls back to the primary if the replica fails, and takes the replica
+    out of rotation for REPLICA_RETRY_SECONDS. A streaming result opened
+    inside read() keeps its replica connection after this returns.
+    """
+    global _replica_down_until
+    if not replica_available():
+        DB_READ_ROUTES.labels("primary").inc()
+        return read()
+
+    g.use_replica = True
+    try:
+        result = read()
+        DB_READ_ROUTES.labels("replica").inc()
+        return result
+    except OperationalError as e:
+        _replica_down_until = time.monotonic() + REPLICA_RETRY_SECONDS
+        print("⚠ Replica read failed, retrying on primary:", e.orig)
+        db.session.rollback()
+    finally:
+        g.use_replica = False
+
+    DB_READ_ROUTES.labels("fallback").inc()
+    return read()
+
+
+def replica_reads(view):
+    """Serve a read-only view from the replica (see read_from_replica)."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        return read_from_replica(lambda: view(*args, **kwargs))
 
-db = SQLAlchemy()
+    return wrapper
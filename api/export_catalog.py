@@ -0,0 +1,24 @@
+import sys
+
+from app import app
+from catalog import export_documents
+from exports import ndjson_chunks
+
+def export(path=None):
+    """Write the published catalog as NDJSON to path (gzipped for .gz), or stdout."""
+    with app.app_context():
+        print("📦 Exporting catalog...", file=sys.stderr)
+        documents = export_documents()
+        chunks = ndjson_chunks(documents, compress=bool(path) and path.endswith(".gz"))
+
+        out = open(path, "wb") if path else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                out.write(chunk)
+        finally:
+            if path:
+                out.close()
+        print("✅ Export complete!", file=sys.stderr)
+
+if __name__ == "__main__":
+    export(sys.argv[1] if len(sys.argv) > 1 else None)
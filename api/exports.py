@@ -0,0 +1,63 @@
+import zlib
+
+from flask import Blueprint, Response, request, stream_with_context
+
+from db import read_from_replica
+from metrics import query_budget
+from catalog import READ_TIME_PUBLISHING, export_documents
+
+export_routes = Blueprint("exports", __name__)
+
+# Bytes of NDJSON gathered before each write
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+
+def ndjson_chunks(documents, compress=False, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield documents as NDJSON in roughly chunk_size pieces, gzipped if compress."""
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    buffer, size = [], 0
+
+    def flush():
+        data = "".join(buffer).encode()
+        buffer.clear()
+        return compressor.compress(data) if compressor else data
+
+    for document in documents:
+        buffer.append(document)
+        buffer.append("\n")
+        size += len(document) + 1
+        if size >= chunk_size:
+            size = 0
+            yield flush()
+
+    tail = flush()
+    yield tail + compressor.flush() if compressor else tail
+
+
+# -----------------------
+# CATALOG EXPORT (API)
+# -----------------------
+
+@export_routes.route("/export/catalog", methods=["GET"])
+@query_budget(6 if READ_TIME_PUBLISHING else 1)
+def export_catalog():
+    """Full published catalog as NDJSON, one program document per line.
+
+    Each line is the same document GET /catalog/programs/<id> serves
+    (terms, lessons, posters and thumbnails included), also for documents
+    gone out of date under read-time publishing. ?gzip=1 returns
+    catalog.ndjson.gz instead.
+    """
+    compress = request.args.get("gzip") in ("1", "true")
+
+    def generate():
+        # Opened inside the stream: the view's session is torn down before streaming starts
+        documents = read_from_replica(export_documents)
+        yield from ndjson_chunks(documents, compress)
+
+    body = stream_with_context(generate())
+    if compress:
+        return Response(body, mimetype="application/gzip", headers={
+            "Content-Disposition": "attachment; filename=catalog.ndjson.gz"
+        })
+    return Response(body, mimetype="application/x-ndjson")
@@ -0,0 +1,221 @@
+"""Bulk-load a synthetic catalog for load tests and benchmarks.
+
+    python generate_catalog.py --programs 1000 --terms 5 --lessons 20
+
+Rows are generated inside Postgres (INSERT ... SELECT generate_series),
+one statement per table, so even millions of lessons load in seconds.
+Ids are derived from --tag, so several runs with different tags can be
+stacked in one database. --reset empties every catalog table first.
+"""
+import argparse
+import time
+
+from app import app
+from db import db
+from assets import refresh_lesson_readiness, refresh_program_readiness
+from catalog import rebuild_all_documents, refresh_program_rollups
+
+# Title vocabulary, so search has realistic hit rates
+WORDS = [
+    "python", "data", "science", "history", "music", "cooking", "yoga", "finance", "design",
+    "physics", "chemistry", "art", "poetry", "travel", "health", "marketing", "writing",
+    "biology", "photography", "gardening"
+]
+
+TABLES = (
+    "catalog_rebuild_queue", "catalog_changes", "catalog_lesson_documents", "catalog_documents",
+    "lesson_assets", "program_assets", "program_topics", "topics", "lessons", "terms", "programs"
+)
+
+# Deterministic ids: md5 of the run tag and the row's position, as a uuid
+ID = "md5(:tag || {key})::uuid"
+
+PROGRAMS_SQL = f"""
+INSERT INTO programs (
+    id, title, description, language_primary, languages_available, status,
+    published_at, created_at, updated_at
+)
+SELECT
+    {ID.format(key="':p:' || p")},
+    initcap(w.words[1 + p % cardinality(w.words)]) || ' ' || initcap(w.words[1 + (p * 7) % cardinality(w.words)])
+        || ' ' || p,
+    'Learn ' || w.words[1 + (p * 3) % cardinality(w.words)] || ' and ' || w.words[1 + (p * 11) % cardinality(w.words)],
+    lang.primary_language,
+    to_jsonb(ARRAY(SELECT DISTINCT unnest(ARRAY[lang.primary_language, lang.second_language]))),
+    'published',
+    timezone('utc', now()) - p * interval '1 minute',
+    timezone('utc', now()) - p * interval '1 minute',
+    timezone('utc', now())
+FROM generate_series(1, :programs) AS p
+CROSS JOIN (SELECT CAST(:words AS text[]) AS words) AS w
+CROSS JOIN LATERAL (
+    SELECT
+        (CAST(:languages AS text[]))[1 + p % cardinality(CAST(:languages AS text[]))] AS primary_language,
+        (CAST(:languages AS text[]))[1 + (p + 1) % cardinality(CAST(:languages AS text[]))] AS second_language
+) AS lang
+"""
+
+TERMS_SQL = f"""
+INSERT INTO terms (id, program_id, term_number, title, created_at, updated_at)
+SELECT
+    {ID.format(key="':t:' || p || ':' || t")},
+    {ID.format(key="':p:' || p")},
+    t, 'Term ' || t, timezone('utc', now()), timezone('utc', now())
+FROM generate_series(1, :programs) AS p, generate_series(1, :terms) AS t
+"""
+
+# Every :scheduled_every-th lesson is scheduled, half of those already due
+# (a worker backlog) and half in the next hour; every 10th is a draft.
+LESSONS_SQL = f"""
+INSERT INTO lessons (
+    id, term_id, lesson_number, title, content_type, duration_ms, is_paid,
+    content_language_primary, content_languages_available, content_urls_by_language,
+    subtitle_languages, subtitle_urls_by_language,
+    status, publish_at, published_at, created_at, updated_at
+)
+SELECT
+    {ID.format(key="':l:' || p || ':' || t || ':' || l")},
+    {ID.format(key="':t:' || p || ':' || t")},
+    l,
+    initcap(w.words[1 + (p + t * 3 + l * 7) % cardinality(w.words)]) || ' lesson ' || l,
+    CASE WHEN l % 3 = 0 THEN 'article' ELSE 'video' END,
+    60000 + (p * 13 + l * 17) % 60 * 60000,
+    l % 4 = 0,
+    lang.primary_language,
+    to_jsonb(ARRAY(SELECT DISTINCT unnest(ARRAY[lang.primary_language, lang.second_language]))),
+    jsonb_build_object(
+        lang.primary_language, 'https://cdn.example.com/' || p || '/' || t || '/' || l || '/' || lang.primary_language,
+        lang.second_language, 'https://cdn.example.com/' || p || '/' || t || '/' || l || '/' || lang.second_language
+    ),
+    CASE WHEN l % 3 = 0 THEN jsonb_build_array(lang.second_language) ELSE '[]'::jsonb END,
+    CASE WHEN l % 3 = 0
+        THEN jsonb_build_object(lang.second_language, 'https://cdn.example.com/' || p || '/' || l || '.vtt')
+        ELSE '{{}}'::jsonb END,
+    s.status,
+    CASE WHEN s.status = 'scheduled'
+        THEN timezone('utc', now()) + ((p + l) % 120 - 60) * interval '1 minute' END,
+    CASE WHEN s.status = 'published' THEN timezone('utc', now()) - l * interval '1 minute' END,
+    timezone('utc', now()),
+    timezone('utc', now())
+FROM generate_series(1, :programs) AS p
+CROSS JOIN generate_series(1, :terms) AS t
+CROSS JOIN generate_series(1, :lessons) AS l
+CROSS JOIN (SELECT CAST(:words AS text[]) AS words) AS w
+CROSS JOIN LATERAL (
+    SELECT
+        (CAST(:languages AS text[]))[1 + p % cardinality(CAST(:languages AS text[]))] AS primary_language,
+        (CAST(:languages AS text[]))[1 + (p + 1) % cardinality(CAST(:languages AS text[]))] AS second_language
+) AS lang
+CROSS JOIN LATERAL (
+    SELECT CASE
+        WHEN (p * 31 + t * 7 + l) % :scheduled_every = 0 THEN 'scheduled'
+        WHEN l % 10 = 9 THEN 'draft'
+        ELSE 'published'
+    END AS status
+) AS s
+"""
+
+PROGRAM_ASSETS_SQL = f"""
+INSERT INTO program_assets (id, program_id, language, variant, asset_type, url, updated_at)
+SELECT
+    {ID.format(key="':pa:' || p.id || ':' || v.variant")},
+    p.id, p.language_primary, v.variant, 'poster',
+    'https://cdn.example.com/posters/' || p.id || '/' || v.variant || '.jpg',
+    timezone('utc', now())
+FROM programs p
+CROSS JOIN (VALUES ('portrait'), ('landscape')) AS v (variant)
+WHERE p.id IN (SELECT {ID.format(key="':p:' || g")} FROM generate_series(1, :programs) AS g)
+"""
+
+# Drafts get no thumbnails, so the not-ready queue has content too
+LESSON_ASSETS_SQL = f"""
+INSERT INTO lesson_assets (id, lesson_id, language, variant, asset_type, url, updated_at)
+SELECT
+    {ID.format(key="':la:' || l.id || ':' || v.variant")},
+    l.id, l.content_language_primary, v.variant, 'thumbnail',
+    'https://cdn.example.com/thumbnails/' || l.id || '/' || v.variant || '.jpg',
+    timezone('utc', now())
+FROM lessons l
+JOIN terms t ON t.id = l.term_id
+CROSS JOIN (VALUES ('portrait'), ('landscape')) AS v (variant)
+WHERE l.status != 'draft'
+  AND t.program_id IN (SELECT {ID.format(key="':p:' || g")} FROM generate_series(1, :programs) AS g)
+"""
+
+TOPICS_SQL = """
+INSERT INTO topics (id, name)
+SELECT md5('topic:' || word)::uuid, initcap(word)
+FROM unnest(CAST(:words AS text[])) AS word
+ON CONFLICT (name) DO NOTHING
+"""
+
+# One to three topics per program
+PROGRAM_TOPICS_SQL = f"""
+INSERT INTO program_topics (program_id, topic_id)
+SELECT DISTINCT {ID.format(key="':p:' || p")}, topics.id
+FROM generate_series(1, :programs) AS p
+CROSS JOIN generate_series(0, p % 3) AS k
+JOIN topics ON topics.name = initcap((CAST(:words AS text[]))[1 + (p * 5 + k * 3) % cardinality(CAST(:words AS text[]))])
+"""
+
+
+def generate(programs, terms, lessons, languages, scheduled_every=20, tag="synthetic", reset=False,
+             documents=True):
+    with app.app_context():
+        print(f"🏭 Generating {programs} program(s) x {terms} term(s) x {lessons} lesson(s)...")
+        started = time.perf_counter()
+
+        if reset:
+            db.session.execute(db.text(f"TRUNCATE {', '.join(TABLES)}"))
+
+        params = {
+            "tag": tag, "programs": programs, "terms": terms, "lessons": lessons,
+            "languages": languages, "words": WORDS, "scheduled_every": scheduled_every
+        }
+        for table, sql in (
+            ("programs", PROGRAMS_SQL), ("terms", TERMS_SQL), ("lessons", LESSONS_SQL),
+            ("program_assets", PROGRAM_ASSETS_SQL), ("lesson_assets", LESSON_ASSETS_SQL),
+            ("topics", TOPICS_SQL), ("program_topics", PROGRAM_TOPICS_SQL),
+        ):
+            step_started = time.perf_counter()
+            count = db.session.execute(db.text(sql), params).rowcount
+            print(f"  {table}: {count} row(s) in {time.perf_counter() - step_started:.1f}s")
+
+        # Derived data, set-based over the whole tables
+        step_started = time.perf_counter()
+        refresh_program_readiness()
+        refresh_lesson_readiness()
+        refresh_program_rollups()
+        db.session.commit()
+        print(f"  readiness and rollups in {time.perf_counter() - step_started:.1f}s")
+        print(f"  loaded in {time.perf_counter() - started:.1f}s")
+
+        if documents:
+            step_started = time.perf_counter()
+            rebuild_all_documents()
+            print(f"  catalog documents in {time.perf_counter() - step_started:.1f}s")
+        db.session.execute(db.text("ANALYZE"))
+        db.session.commit()
+        print(f"✅ Catalog generated in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-load a synthetic catalog")
+    parser.add_argument("--programs", type=int, default=100)
+    parser.add_argument("--terms", type=int, default=4, help="terms per program")
+    parser.add_argument("--lessons", type=int, default=10, help="lessons per term")
+    parser.add_argument("--languages", default="en,hi,ta,fr,es", help="comma separated language codes")
+    parser.add_argument("--scheduled-every", type=int, default=20, help="one lesson in N is scheduled")
+    parser.add_argument("--tag", default="synthetic", help="id namespace; use a new tag to add more rows")
+    parser.add_argument("--reset", action="store_true", help="empty all catalog tables first")
+    parser.add_argument(
+        "--no-documents", action="store_true",
+        help="skip rendering catalog documents (run rebuild_catalog.py later)"
+    )
+    args = parser.parse_args()
+
+    generate(
+        args.programs, args.terms, args.lessons, args.languages.split(","),
+        scheduled_every=args.scheduled_every, tag=args.tag, reset=args.reset,
+        documents=not args.no_documents
+    )
@@ -0,0 +1,331 @@
+import json
+import uuid
+from datetime import datetime
+
+from flask import Blueprint, request, jsonify
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+from db import db
+from models import Program, Term, Lesson, ProgramAsset, LessonAsset
+from assets import refresh_lesson_readiness, refresh_program_readiness
+from catalog import READ_TIME_PUBLISHING, on_programs_changed
+from publishing import notify_schedule_changed
+
+import_routes = Blueprint("imports", __name__)
+
+PROGRAM_IMPORT_STATUSES = ("draft", "published")
+LESSON_IMPORT_STATUSES = ("draft", "scheduled", "published")
+CONTENT_TYPES = ("video", "article")
+REQUIRED_VARIANTS = {"portrait", "landscape"}
+
+
+# -----------------------
+# VALIDATION
+# -----------------------
+
+class TreeValidator:
+    """Collects every problem in an import payload, keyed by item path."""
+
+    def __init__(self):
+        self.errors = []
+
+    def error(self, path, message):
+        self.errors.append({"path": path, "message": message})
+
+    def check_type(self, value, path, field, kind):
+        # bool is an int subclass; don't accept true/false as numbers
+        if not isinstance(value, kind) or (isinstance(value, bool) and kind is not bool):
+            self.error(f"{path}.{field}", f"must be of type {kind.__name__}")
+
+    def require(self, item, path, field, kind):
+        value = item.get(field)
+        if value is None:
+            self.error(f"{path}.{field}", "is required")
+        else:
+            self.check_type(value, path, field, kind)
+        return value
+
+    def optional(self, item, path, field, kind):
+        value = item.get(field)
+        if value is not None:
+            self.check_type(value, path, field, kind)
+        return value
+
+    def children(self, item, path, field):
+        """Items of an optional list field; anything else is an error and has none."""
+        value = self.optional(item, path, field, list)
+        return value if isinstance(value, list) else []
+
+    def assets(self, item, path, primary_language):
+        """Validate an assets list; return the variants present for primary_language."""
+        seen = set()
+        for i, asset in enumerate(self.children(item, path, "assets")):
+            asset_path = f"{path}.assets[{i}]"
+            if not isinstance(asset, dict):
+                self.error(asset_path, "must be an object")
+                continue
+            key = (
+                self.require(asset, asset_path, "language", str),
+                self.require(asset, asset_path, "variant", str),
+            )
+            self.require(asset, asset_path, "url", str)
+            if not all(isinstance(part, str) for part in key):
+                continue
+            if key in seen:
+                self.error(asset_path, f"duplicate asset for language {key[0]!r}, variant {key[1]!r}")
+            seen.add(key)
+        return {variant for language, variant in seen if language == primary_language}
+
+    def program(self, tree, path):
+        if not isinstance(tree, dict):
+            self.error(path, "must be an object")
+            return
+
+        self.require(tree, path, "title", str)
+        self.optional(tree, path, "description", str)
+        language = self.require(tree, path, "language_primary", str)
+        languages = self.require(tree, path, "languages_available", list)
+        if isinstance(languages, list) and isinstance(language, str) and language not in languages:
+            self.error(f"{path}.languages_available", "must include language_primary")
+
+        status = tree.get("status", "draft")
+        if status not in PROGRAM_IMPORT_STATUSES:
+            self.error(f"{path}.status", f"must be one of {', '.join(PROGRAM_IMPORT_STATUSES)}")
+
+        posters = self.assets(tree, path, language)
+        if status == "published" and not REQUIRED_VARIANTS <= posters:
+            self.error(f"{path}.assets", "published programs need portrait and landscape posters")
+
+        term_numbers = set()
+        for i, term in enumerate(self.children(tree, path, "terms")):
+            term_path = f"{path}.terms[{i}]"
+            if not isinstance(term, dict):
+                self.error(term_path, "must be an object")
+                continue
+
+            number = self.require(term, term_path, "term_number", int)
+            if type(number) is int:
+                if number in term_numbers:
+                    self.error(f"{term_path}.term_number", f"duplicate term number {number}")
+                term_numbers.add(number)
+            self.optional(term, term_path, "title", str)
+
+            lesson_numbers = set()
+            for j, lesson in enumerate(self.children(term, term_path, "lessons")):
+                lesson_path = f"{term_path}.lessons[{j}]"
+                if not isinstance(lesson, dict):
+                    self.error(lesson_path, "must be an object")
+                    continue
+
+                number = self.require(lesson, lesson_path, "lesson_number", int)
+                if type(number) is int:
+                    if number in lesson_numbers:
+                        self.error(f"{lesson_path}.lesson_number", f"duplicate lesson number {number}")
+                    lesson_numbers.add(number)
+                self.lesson(lesson, lesson_path)
+
+    def lesson(self, lesson, path):
+        self.require(lesson, path, "title", str)
+        content_type = self.require(lesson, path, "content_type", str)
+        if content_type and content_type not in CONTENT_TYPES:
+            self.error(f"{path}.content_type", f"must be one of {', '.join(CONTENT_TYPES)}")
+        self.optional(lesson, path, "duration_ms", int)
+        self.optional(lesson, path, "is_paid", bool)
+
+        language = self.require(lesson, path, "content_language_primary", str)
+        languages = self.require(lesson, path, "content_languages_available", list)
+        if isinstance(languages, list) and isinstance(language, str) and language not in languages:
+            self.error(f"{path}.content_languages_available", "must include content_language_primary")
+        self.require(lesson, path, "content_urls_by_language", dict)
+        self.optional(lesson, path, "subtitle_languages", list)
+        self.optional(lesson, path, "subtitle_urls_by_language", dict)
+
+        status = lesson.get("status", "draft")
+        if status not in LESSON_IMPORT_STATUSES:
+            self.error(f"{path}.status", f"must be one of {', '.join(LESSON_IMPORT_STATUSES)}")
+
+        if status == "scheduled":
+            try:
+                datetime.fromisoformat(lesson["publish_at"])
+            except (KeyError, TypeError, ValueError):
+                self.error(f"{path}.publish_at", "scheduled lessons need an ISO 8601 publish_at")
+
+        thumbnails = self.assets(lesson, path, language)
+        if status == "published" and not REQUIRED_VARIANTS <= thumbnails:
+            self.error(f"{path}.assets", "published lessons need portrait and landscape thumbnails")
+
+
+# -----------------------
+# ROW BUILDING
+# -----------------------
+
+def tree_rows(tree, rows, now):
+    """Flatten one validated program tree into insert rows (ids assigned here)."""
+    program_id = str(uuid.uuid4())
+    status = tree.get("status", "draft")
+    rows["programs"].append({
+        "id": program_id,
+        "title": tree["title"],
+        "description": tree.get("description"),
+        "language_primary": tree["language_primary"],
+        "languages_available": tree["languages_available"],
+        "status": status,
+        "published_at": now if status == "published" else None,
+        "created_at": now
+    })
+    for asset in tree.get("assets") or []:
+        rows["program_assets"].append({
+            "id": str(uuid.uuid4()),
+            "program_id": program_id,
+            "language": asset["language"],
+            "variant": asset["variant"],
+            "asset_type": "poster",
+            "url": asset["url"]
+        })
+
+    summary = {"id": program_id, "title": tree["title"], "terms": 0, "lessons": 0}
+    for term in tree.get("terms") or []:
+        term_id = str(uuid.uuid4())
+        rows["terms"].append({
+            "id": term_id,
+            "program_id": program_id,
+            "term_number": term["term_number"],
+            "title": term.get("title"),
+            "created_at": now
+        })
+        summary["terms"] += 1
+
+        for lesson in term.get("lessons") or []:
+            lesson_id = str(uuid.uuid4())
+            status = lesson.get("status", "draft")
+            rows["lessons"].append({
+                "id": lesson_id,
+                "term_id": term_id,
+                "lesson_number": lesson["lesson_number"],
+                "title": lesson["title"],
+                "content_type": lesson["content_type"],
+                "duration_ms": lesson.get("duration_ms"),
+                "is_paid": lesson.get("is_paid", False),
+                "content_language_primary": lesson["content_language_primary"],
+                "content_languages_available": lesson["content_languages_available"],
+                "content_urls_by_language": lesson["content_urls_by_language"],
+                "subtitle_languages": lesson.get("subtitle_languages"),
+                "subtitle_urls_by_language": lesson.get("subtitle_urls_by_language"),
+                "status": status,
+                "publish_at": datetime.fromisoformat(lesson["publish_at"]) if status == "scheduled" else None,
+                "published_at": now if status == "published" else None,
+                "created_at": now
+            })
+            summary["lessons"] += 1
+
+            for asset in lesson.get("assets") or []:
+                rows["lesson_assets"].append({
+                    "id": str(uuid.uuid4()),
+                    "lesson_id": lesson_id,
+                    "language": asset["language"],
+                    "variant": asset["variant"],
+                    "asset_type": "thumbnail",
+                    "url": asset["url"]
+                })
+
+    return summary
+
+
+def read_trees():
+    """Yield (path, tree) pairs from a JSON or NDJSON request body."""
+    if request.mimetype == "application/x-ndjson":
+        for number, line in enumerate(request.stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield f"line {number}", json.loads(line)
+            except ValueError:
+                yield f"line {number}", ValueError("is not valid JSON")
+        return
+
+    data = request.get_json(silent=True)
+    if isinstance(data, dict) and "programs" in data:
+        data = data["programs"]
+    if isinstance(data, dict):
+        data = [data]
+    if not isinstance(data, list):
+        yield "body", ValueError("must be a program tree, a list of trees or {\"programs\": [...]}")
+        return
+    for i, tree in enumerate(data):
+        yield f"programs[{i}]", tree
+
+
+# -----------------------
+# BULK IMPORT (API)
+# -----------------------
+
+@import_routes.route("/import/programs", methods=["POST"])
+def import_programs():
+    """Import whole Program -> Terms -> Lessons -> Assets trees in one transaction.
+
+    Nothing is written unless every item validates.
+    """
+    validator = TreeValidator()
+    trees = []
+    for path, tree in read_trees():
+        if isinstance(tree, ValueError):
+            validator.error(path, str(tree))
+            continue
+        validator.program(tree, path)
+        trees.append(tree)
+
+    if validator.errors:
+        return jsonify({
+            "code": "VALIDATION_FAILED",
+            "message": f"{len(validator.errors)} problem(s) found; nothing was imported",
+            "errors": validator.errors
+        }), 400
+
+    if not trees:
+        return jsonify({"code": "EMPTY_IMPORT", "message": "No programs to import"}), 400
+
+    now = datetime.utcnow()
+    rows = {"programs": [], "terms": [], "lessons": [], "program_assets": [], "lesson_assets": []}
+    summaries = [tree_rows(tree, rows, now) for tree in trees]
+
+    try:
+        # Parents first; each insert is one batched executemany
+        for model, key in (
+            (Program, "programs"), (Term, "terms"), (Lesson, "lessons"),
+            (ProgramAsset, "program_assets"), (LessonAsset, "lesson_assets"),
+        ):
+            if rows[key]:
+                db.session.execute(insert(model), rows[key])
+
+        refresh_program_readiness([program["id"] for program in rows["programs"]])
+        refresh_lesson_readiness([lesson["id"] for lesson in rows["lessons"]])
+
+        program_by_term = {term["id"]: term["program_id"] for term in rows["terms"]}
+        published_programs = {
+            program_by_term[lesson["term_id"]]
+            for lesson in rows["lessons"] if lesson["status"] == "published"
+        }
+        scheduled_programs = {
+            program_by_term[lesson["term_id"]]
+            for lesson in rows["lessons"] if lesson["status"] == "scheduled"
+        }
+        changed_programs = published_programs
+        if READ_TIME_PUBLISHING:
+            # Scheduled lessons may already be due, and set the documents' expiry
+            changed_programs = published_programs | scheduled_programs
+        if changed_programs:
+            on_programs_changed(changed_programs)
+        if scheduled_programs:
+            notify_schedule_changed()
+
+        db.session.commit()
+    except IntegrityError as e:
+        db.session.rollback()
+        return jsonify({"code": "CONFLICT", "message": str(e.orig)}), 409
+
+    return jsonify({
+        "message": "Import complete",
+        "programs": summaries,
+        "counts": {key: len(value) for key, value in rows.items()}
+    })
@@ -0,0 +1,171 @@
+import os
+import time
+
+from flask import Response, current_app, g, has_request_context, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest, multiprocess
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+REQUEST_LATENCY = Histogram(
+    "cms_http_request_duration_seconds",
+    "HTTP request latency by endpoint",
+    ["endpoint", "method", "status"]
+)
+
+REQUEST_DB_QUERIES = Histogram(
+    "cms_http_request_db_queries",
+    "SQL statements executed per HTTP request",
+    ["endpoint"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 1000)
+)
+
+CACHE_LOOKUPS = Counter(
+    "cms_catalog_cache_lookups_total",
+    "Catalog cache lookups by cache (payloads, fragments) and result (hit, miss, bypass)",
+    ["cache", "result"]
+)
+
+DB_READ_ROUTES = Counter(
+    "cms_db_read_routes_total",
+    "Catalog read requests by database served (replica, primary, fallback)",
+    ["target"]
+)
+
+QUERY_BUDGET_EXCEEDED = Counter(
+    "cms_query_budget_exceeded_total",
+    "Requests that ran more SQL statements than their endpoint's query budget",
+    ["endpoint"]
+)
+
+# Send Server-Timing headers (DB time and statement count) on every response
+SERVER_TIMING = os.getenv("SERVER_TIMING", "true").lower() == "true"
+# Print statement count, DB time and the slowest statements for every request
+SQL_DEBUG_LOG = os.getenv("SQL_DEBUG_LOG", "false").lower() == "true"
+SLOWEST_STATEMENTS = 3
+
+
+class QueryBudgetExceeded(RuntimeError):
+    """A request ran more SQL statements than its view's query_budget."""
+
+
+def query_budget(max_statements):
+    """Declare the most SQL statements one request to this view may run.
+
+    Place it below the route decorator. Over budget, the request is
+    logged and counted; with QUERY_BUDGETS_STRICT it raises
+    QueryBudgetExceeded instead, which tests/test_query_budgets.py runs
+    every budgeted view under, so N+1 regressions fail the tests.
+    """
+    def decorator(view):
+        view.query_budget = max_statements
+        return view
+
+    return decorator
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def count_request_queries(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.db_query_count = g.get("db_query_count", 0) + 1
+        if context is not None:
+            context.request_query_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def time_request_queries(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "request_query_started", None)
+    if started is None or not has_request_context():
+        return
+
+    elapsed = time.perf_counter() - started
+    g.db_time = g.get("db_time", 0.0) + elapsed
+
+    slowest = g.setdefault("db_slowest", [])
+    if len(slowest) < SLOWEST_STATEMENTS or elapsed > slowest[-1][0]:
+        slowest.append((elapsed, " ".join(statement.split())[:200]))
+        slowest.sort(key=lambda entry: entry[0], reverse=True)
+        del slowest[SLOWEST_STATEMENTS:]
+
+
+def endpoint_label():
+    # The route pattern, not the raw path, keeps label cardinality bounded
+    return request.url_rule.rule if request.url_rule else "unmatched"
+
+
+def start_timer():
+    g.request_started = time.perf_counter()
+    g.db_query_count = 0
+    g.db_time = 0.0
+    g.db_slowest = []
+
+
+def record_request(response):
+    started = g.get("request_started")
+    if started is not None:
+        endpoint = endpoint_label()
+        REQUEST_LATENCY.labels(endpoint, request.method, response.status_code).observe(
+            time.perf_counter() - started
+        )
+        REQUEST_DB_QUERIES.labels(endpoint).observe(g.get("db_query_count", 0))
+        # stream_with_context tears the request down twice: skip the first
+        g.defer_budget_check = response.is_streamed
+
+        if SERVER_TIMING:
+            # Streamed bodies run their queries after this point; the
+            # debug log and budget check (on teardown) see the full count
+            response.headers.add(
+                "Server-Timing",
+                f'db;dur={g.get("db_time", 0.0) * 1000:.1f};desc="{g.get("db_query_count", 0)} queries", '
+                f"total;dur={(time.perf_counter() - started) * 1000:.1f}"
+            )
+    return response
+
+
+def check_query_budget(exc=None):
+    """Debug log and query budget check, once the request (and any stream) is done."""
+    if g.get("request_started") is None or g.pop("defer_budget_check", False):
+        return
+
+    count = g.get("db_query_count", 0)
+    endpoint = endpoint_label()
+    if SQL_DEBUG_LOG:
+        print(f"🧮 {request.method} {endpoint}: {count} statement(s), {g.get('db_time', 0.0) * 1000:.1f} ms in DB")
+        for elapsed, statement in g.get("db_slowest", []):
+            print(f"    {elapsed * 1000:8.1f} ms  {statement}")
+
+    view = current_app.view_functions.get(request.endpoint)
+    budget = getattr(view, "query_budget", None)
+    if budget is None or count <= budget:
+        return
+
+    QUERY_BUDGET_EXCEEDED.labels(endpoint).inc()
+    message = f"{request.method} {endpoint} ran {count} SQL statements (budget {budget})"
+    if current_app.config["QUERY_BUDGETS_STRICT"]:
+        raise QueryBudgetExceeded(message)
+    print("⚠ Query budget exceeded:", message)
+
+
+def metrics_payload():
+    # Aggregate across server processes when running under a multi-process server
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry)
+
+
+def metrics_view():
+    return Response(metrics_payload(), mimetype=CONTENT_TYPE_LATEST)
+
+
+def init_metrics(app):
+    app.config.setdefault(
+        "QUERY_BUDGETS_STRICT", os.getenv("QUERY_BUDGETS_STRICT", "false").lower() == "true"
+    )
+    app.before_request(start_timer)
+    app.after_request(record_request)
+    app.teardown_request(check_query_budget)
+    app.add_url_rule("/metrics", "metrics", metrics_view)
@@ -0,0 +1,167 @@
+from app import app
+from db import db
+from models import LESSON_SEARCH_SQL, PROGRAM_SEARCH_SQL
+from assets import refresh_lesson_readiness, refresh_program_readiness
+from catalog import rebuild_all_documents, refresh_program_rollups
+from migrate_uuid import (
+    PHASES, backfill, expand, migrate_uuid, not_null_check, pending_columns, prove_not_null, query, run, shadow
+)
+import models  # noqa: F401  (registers tables for create_all)
+
+# Language lists filtered with jsonb containment. Older databases store
+# them as json; converted online, like the uuid keys, since ALTER COLUMN
+# TYPE would rewrite programs and lessons under an exclusive lock.
+JSONB_COLUMNS = {
+    "programs": ("languages_available",),
+    "lessons": ("content_languages_available", "subtitle_languages"),
+}
+
+
+def pending_json_columns():
+    """{table: [(column, not_null)]} for JSONB_COLUMNS still stored as json."""
+    pending = {}
+    for row in query("""
+        SELECT table_name, column_name, is_nullable = 'NO' AS not_null
+        FROM information_schema.columns
+        WHERE table_schema = current_schema() AND data_type = 'json'
+        ORDER BY table_name, ordinal_position
+    """):
+        if row.column_name in JSONB_COLUMNS.get(row.table_name, ()):
+            pending.setdefault(row.table_name, []).append((row.column_name, row.not_null))
+    return pending
+
+
+def json_to_jsonb(pending):
+    """Shadow jsonb columns kept in sync by triggers, backfilled in slices, then swapped in."""
+    expand(pending, "jsonb")
+    backfill(pending, "jsonb")
+    for table, columns in pending.items():
+        prove_not_null(table, columns, "jsonb")
+
+    # One short transaction; the GIN indexes on the jsonb columns are STEPS below
+    statements = []
+    for table, columns in pending.items():
+        statements += [
+            f"DROP TRIGGER IF EXISTS {table}_jsonb_sync ON {table}",
+            f"DROP FUNCTION IF EXISTS {table}_jsonb_sync()",
+        ]
+        for column, not_null in columns:
+            if not_null:
+                statements += [
+                    f"ALTER TABLE {table} ALTER COLUMN {shadow(column, 'jsonb')} SET NOT NULL",
+                    f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {not_null_check(table, column, 'jsonb')}",
+                ]
+            statements += [
+                f"ALTER TABLE {table} DROP COLUMN {column}",
+                f"ALTER TABLE {table} RENAME COLUMN {shadow(column, 'jsonb')} TO {column}",
+            ]
+    run(*statements)
+
+
+# Idempotent schema upgrades for databases created before a column or
+# index existed. New tables are handled by db.create_all().
+STEPS = [
+    # Program catalog rollups
+    "ALTER TABLE programs ADD COLUMN IF NOT EXISTS published_term_count INTEGER NOT NULL DEFAULT 0",
+    "ALTER TABLE programs ADD COLUMN IF NOT EXISTS published_lesson_count INTEGER NOT NULL DEFAULT 0",
+    "ALTER TABLE programs ADD COLUMN IF NOT EXISTS published_duration_ms BIGINT NOT NULL DEFAULT 0",
+    "ALTER TABLE programs ADD COLUMN IF NOT EXISTS paid_lesson_count INTEGER NOT NULL DEFAULT 0",
+    "ALTER TABLE programs ADD COLUMN IF NOT EXISTS free_lesson_count INTEGER NOT NULL DEFAULT 0",
+    "DROP INDEX IF EXISTS ix_programs_catalog",
+    "CREATE INDEX IF NOT EXISTS ix_programs_catalog_keyset ON programs "
+    "(published_at DESC NULLS LAST, id DESC) WHERE published_lesson_count > 0",
+
+    # Catalog filters and scheduled publishing
+    "CREATE INDEX IF NOT EXISTS ix_programs_status_language_published ON programs "
+    "(status, language_primary, published_at, id)",
+    "CREATE INDEX IF NOT EXISTS ix_lessons_status_publish_at ON lessons (status, publish_at)",
+
+    # Publish-readiness flags
+    "ALTER TABLE programs ADD COLUMN IF NOT EXISTS has_portrait_poster BOOLEAN NOT NULL DEFAULT false",
+    "ALTER TABLE programs ADD COLUMN IF NOT EXISTS has_landscape_poster BOOLEAN NOT NULL DEFAULT false",
+    "ALTER TABLE lessons ADD COLUMN IF NOT EXISTS has_portrait_thumbnail BOOLEAN NOT NULL DEFAULT false",
+    "ALTER TABLE lessons ADD COLUMN IF NOT EXISTS has_landscape_thumbnail BOOLEAN NOT NULL DEFAULT false",
+    "DROP INDEX IF EXISTS ix_lessons_scheduled_publish_at",
+    "CREATE INDEX IF NOT EXISTS ix_lessons_scheduled_ready_publish_at ON lessons (publish_at) "
+    "WHERE status = 'scheduled' AND has_portrait_thumbnail AND has_landscape_thumbnail",
+    "CREATE INDEX IF NOT EXISTS ix_programs_not_ready ON programs (created_at) "
+    "WHERE NOT (has_portrait_poster AND has_landscape_poster)",
+    "CREATE INDEX IF NOT EXISTS ix_lessons_not_ready ON lessons (term_id) "
+    "WHERE status IN ('draft', 'scheduled') AND NOT (has_portrait_thumbnail AND has_landscape_thumbnail)",
+
+    # Admin program list sorting
+    "CREATE INDEX IF NOT EXISTS ix_programs_created_at_id ON programs (created_at, id)",
+    "CREATE INDEX IF NOT EXISTS ix_programs_title_id ON programs (title, id)",
+
+    # updated_at tracking (change feed)
+    "ALTER TABLE programs ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP",
+    "ALTER TABLE terms ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP",
+    "ALTER TABLE lessons ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP",
+    "ALTER TABLE program_assets ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP",
+    "ALTER TABLE lesson_assets ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP",
+    "UPDATE programs SET updated_at = created_at WHERE updated_at IS NULL",
+    "UPDATE terms SET updated_at = created_at WHERE updated_at IS NULL",
+    "UPDATE lessons SET updated_at = created_at WHERE updated_at IS NULL",
+    "UPDATE program_assets SET updated_at = timezone('utc', now()) WHERE updated_at IS NULL",
+    "UPDATE lesson_assets SET updated_at = timezone('utc', now()) WHERE updated_at IS NULL",
+
+    # Full-text search
+    "ALTER TABLE programs ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    f"GENERATED ALWAYS AS ({PROGRAM_SEARCH_SQL}) STORED",
+    "ALTER TABLE lessons ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    f"GENERATED ALWAYS AS ({LESSON_SEARCH_SQL}) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_programs_search ON programs USING gin (search_vector) "
+    "WHERE published_lesson_count > 0",
+    "CREATE INDEX IF NOT EXISTS ix_lessons_search ON lessons USING gin (search_vector) "
+    "WHERE status = 'published'",
+
+    # Topic filters and facets
+    "CREATE INDEX IF NOT EXISTS ix_program_topics_topic_program ON program_topics (topic_id, program_id)",
+
+    # Language filters (json columns are converted before these steps)
+    "CREATE INDEX IF NOT EXISTS ix_programs_languages ON programs "
+    "USING gin (languages_available jsonb_path_ops) WHERE published_lesson_count > 0",
+    "CREATE INDEX IF NOT EXISTS ix_lessons_languages ON lessons "
+    "USING gin (content_languages_available jsonb_path_ops) WHERE status = 'published'",
+    "CREATE INDEX IF NOT EXISTS ix_lessons_subtitles ON lessons "
+    "USING gin (subtitle_languages jsonb_path_ops) WHERE status = 'published'",
+
+    # Read-time publishing
+    "ALTER TABLE catalog_documents ADD COLUMN IF NOT EXISTS expires_at TIMESTAMP",
+    "ALTER TABLE lessons ADD COLUMN IF NOT EXISTS ready_at TIMESTAMP",
+    # Ready before this column existed: as early as we know, so publish_at wins
+    "UPDATE lessons SET ready_at = created_at "
+    "WHERE ready_at IS NULL AND has_portrait_thumbnail AND has_landscape_thumbnail",
+]
+
+
+def migrate():
+    with app.app_context():
+        print("🛠 Migrating database...")
+
+        # String ids from before uuid keys, converted first: new tables'
+        # uuid foreign keys can't reference them. The phases can also be
+        # run one by one.
+        if pending_columns():
+            migrate_uuid(list(PHASES))
+        db.create_all()
+        # Before STEPS: the conversion commits in slices on its own connections
+        pending = pending_json_columns()
+        if pending:
+            print("🛠 Converting language lists to jsonb...")
+            json_to_jsonb(pending)
+
+        for statement in STEPS:
+            db.session.execute(db.text(statement))
+
+        # Backfill derived data
+        refresh_program_rollups()
+        refresh_program_readiness()
+        refresh_lesson_readiness()
+        db.session.commit()
+        rebuild_all_documents()
+
+        print("✅ Migration complete!")
+
+if __name__ == "__main__":
+    migrate()
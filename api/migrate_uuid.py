@@ -0,0 +1,285 @@
+"""Online conversion of string id columns to native uuid columns.
+
+Databases created before the id columns were uuid still have varchar
+keys (db.create_all() never alters an existing table). This converts
+them in phases, each safe to re-run, without holding long locks:
+
+    python migrate_uuid.py expand     # shadow uuid columns, kept in sync by triggers
+    python migrate_uuid.py backfill   # fill the shadow columns, a slice of the table per transaction
+    python migrate_uuid.py index      # every id index rebuilt on the shadow columns, CONCURRENTLY
+    python migrate_uuid.py swap       # one short transaction: swap columns, keys and foreign keys
+    python migrate_uuid.py validate   # check the re-added foreign keys without blocking writes
+
+`python migrate_uuid.py all` runs them in order. The API and worker of
+this release expect uuid columns, so deploy them right after the swap.
+"""
+import argparse
+import re
+import time
+
+from app import app
+from db import db
+from models import UUIDString
+
+# DDL gives up instead of queueing (and blocking traffic) behind a long transaction
+LOCK_TIMEOUT = "5s"
+# Heap pages (8 kB each) updated per backfill transaction
+BACKFILL_PAGES = 1000
+
+
+def id_columns():
+    """(table, column) for every model column stored as a uuid."""
+    return {
+        (table.name, column.name)
+        for table in db.metadata.sorted_tables
+        for column in table.columns
+        if isinstance(column.type, UUIDString)
+    }
+
+
+def shadow(column, type_name="uuid"):
+    return f"{column}_{type_name}"
+
+
+def run(*statements):
+    """Run statements in one transaction, failing fast if a lock isn't granted."""
+    with db.engine.begin() as conn:
+        conn.execute(db.text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+        for statement in statements:
+            conn.execute(db.text(statement))
+
+
+def run_outside_transaction(statement):
+    """For CREATE INDEX CONCURRENTLY and friends."""
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(db.text(statement))
+
+
+def query(sql, **params):
+    with db.engine.connect() as conn:
+        return conn.execute(db.text(sql), params).all()
+
+
+def pending_columns():
+    """{table: [(column, not_null)]} for id columns that aren't uuid yet."""
+    wanted = id_columns()
+    pending = {}
+    for row in query("""
+        SELECT table_name, column_name, is_nullable = 'NO' AS not_null
+        FROM information_schema.columns
+        WHERE table_schema = current_schema() AND data_type != 'uuid'
+        ORDER BY table_name, ordinal_position
+    """):
+        if (row.table_name, row.column_name) in wanted:
+            pending.setdefault(row.table_name, []).append((row.column_name, row.not_null))
+    return pending
+
+
+def shadow_indexes(table, columns):
+    """(index, shadow index, shadow CREATE INDEX) for each index on the table's id columns."""
+    names = [column for column, _ in columns]
+    references = re.compile(r"\b(" + "|".join(names) + r")\b")
+
+    indexes = []
+    for row in query("""
+        SELECT i.relname AS name, pg_get_indexdef(i.oid) AS definition
+        FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid
+        WHERE x.indrelid = CAST(:table AS regclass)
+        ORDER BY i.relname
+    """, table=table):
+        prefix, _, rest = row.definition.partition(" ON ")
+        if row.name.endswith("_uuid") or not references.search(rest):
+            continue
+        name = shadow(row.name)
+        definition = (
+            prefix.replace(f"INDEX {row.name}", f"INDEX CONCURRENTLY IF NOT EXISTS {name}")
+            + " ON " + references.sub(lambda m: shadow(m.group(1)), rest)
+        )
+        indexes.append((row.name, name, definition))
+    return indexes
+
+
+def not_null_check(table, column, type_name="uuid"):
+    return f"{table}_{shadow(column, type_name)}_not_null"
+
+
+# -----------------------
+# PHASES
+# -----------------------
+
+def expand(pending, type_name="uuid"):
+    """Add the shadow columns and a trigger filling them on every write."""
+    for table, columns in pending.items():
+        sync = f"{table}_{type_name}_sync"
+        assignments = " ".join(f"NEW.{shadow(c, type_name)} := NEW.{c}::{type_name};" for c, _ in columns)
+        run(
+            *(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {shadow(c, type_name)} {type_name}" for c, _ in columns),
+            f"CREATE OR REPLACE FUNCTION {sync}() RETURNS trigger AS $$ "
+            f"BEGIN {assignments} RETURN NEW; END $$ LANGUAGE plpgsql",
+            f"DROP TRIGGER IF EXISTS {sync} ON {table}",
+            f"CREATE TRIGGER {sync} BEFORE INSERT OR UPDATE ON {table} "
+            f"FOR EACH ROW EXECUTE FUNCTION {sync}()",
+        )
+        print(f"  {table}: {', '.join(shadow(c, type_name) for c, _ in columns)}")
+
+
+def backfill(pending, type_name="uuid"):
+    """Copy existing values into the shadow columns, BACKFILL_PAGES heap pages at a time."""
+    for table, columns in pending.items():
+        started = time.perf_counter()
+        missing = " OR ".join(f"({shadow(c, type_name)} IS NULL AND {c} IS NOT NULL)" for c, _ in columns)
+        update = (
+            f"UPDATE {table} SET "
+            + ", ".join(f"{shadow(c, type_name)} = {c}::{type_name}" for c, _ in columns)
+            + f" WHERE ({missing})"
+        )
+        pages = query(
+            "SELECT pg_relation_size(CAST(:table AS regclass)) / current_setting('block_size')::int AS pages",
+            table=table
+        )[0].pages
+
+        for start in range(0, pages, BACKFILL_PAGES):
+            run(f"{update} AND ctid >= '({start},0)'::tid AND ctid < '({start + BACKFILL_PAGES},0)'::tid")
+        # Rows moved past the scanned range by concurrent updates
+        run(update)
+        print(f"  {table}: {pages} page(s) in {time.perf_counter() - started:.1f}s")
+
+
+def prove_not_null(table, columns, type_name="uuid"):
+    """Validated CHECKs on the NOT NULL shadow columns, so the swap's SET NOT NULL skips its table scan."""
+    for column, not_null in columns:
+        if not not_null:
+            continue
+        check = not_null_check(table, column, type_name)
+        if not query("SELECT 1 FROM pg_constraint WHERE conname = :name", name=check):
+            run(
+                f"ALTER TABLE {table} ADD CONSTRAINT {check} "
+                f"CHECK ({shadow(column, type_name)} IS NOT NULL) NOT VALID"
+            )
+        run(f"ALTER TABLE {table} VALIDATE CONSTRAINT {check}")
+
+
+def build_indexes(pending):
+    """Shadow copies of every index on the id columns, plus NOT NULL proofs for the swap."""
+    for table, columns in pending.items():
+        prove_not_null(table, columns)
+
+        for _, name, definition in shadow_indexes(table, columns):
+            # A failed concurrent build leaves an invalid index behind; start over
+            if query("SELECT 1 FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid "
+                     "WHERE i.relname = :name AND NOT x.indisvalid", name=name):
+                run_outside_transaction(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+            started = time.perf_counter()
+            run_outside_transaction(definition)
+            print(f"  {table}: {name} in {time.perf_counter() - started:.1f}s")
+
+
+def swap(pending):
+    """Replace the string columns with their shadows, in one short transaction."""
+    tables = list(pending)
+    for table, columns in pending.items():
+        missing = " OR ".join(f"({shadow(c)} IS NULL AND {c} IS NOT NULL)" for c, _ in columns)
+        if query(f"SELECT 1 FROM {table} WHERE {missing} LIMIT 1"):
+            raise SystemExit(f"❌ {table} is not fully backfilled; run the backfill phase first")
+        built = {row.relname for row in query(
+            "SELECT i.relname FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid "
+            "WHERE x.indrelid = CAST(:table AS regclass) AND x.indisvalid", table=table
+        )}
+        if any(name not in built for _, name, _ in shadow_indexes(table, columns)):
+            raise SystemExit(f"❌ {table} is missing shadow indexes; run the index phase first")
+
+    foreign_keys = query("""
+        SELECT conrelid::regclass::text AS table_name, conname, pg_get_constraintdef(oid) AS definition
+        FROM pg_constraint
+        WHERE contype = 'f'
+          AND (conrelid = ANY(CAST(:tables AS regclass[])) OR confrelid = ANY(CAST(:tables AS regclass[])))
+    """, tables=tables)
+
+    statements = [f"ALTER TABLE {fk.table_name} DROP CONSTRAINT {fk.conname}" for fk in foreign_keys]
+    for table, columns in pending.items():
+        # Keys backed by the indexes being replaced, re-attached to their shadows below
+        keys = {row.index_name: row for row in query("""
+            SELECT i.relname AS index_name, c.conname, c.contype
+            FROM pg_constraint c JOIN pg_class i ON i.oid = c.conindid
+            WHERE c.conrelid = CAST(:table AS regclass) AND c.contype IN ('p', 'u')
+        """, table=table)}
+        indexes = shadow_indexes(table, columns)
+
+        statements += [
+            f"DROP TRIGGER IF EXISTS {table}_uuid_sync ON {table}",
+            f"DROP FUNCTION IF EXISTS {table}_uuid_sync()",
+        ]
+        for column, not_null in columns:
+            if not_null:
+                statements += [
+                    f"ALTER TABLE {table} ALTER COLUMN {shadow(column)} SET NOT NULL",
+                    f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {not_null_check(table, column)}",
+                ]
+            # Drops the string column's indexes and keys with it
+            statements += [
+                f"ALTER TABLE {table} DROP COLUMN {column}",
+                f"ALTER TABLE {table} RENAME COLUMN {shadow(column)} TO {column}",
+            ]
+        for original, name, _ in indexes:
+            key = keys.get(original)
+            statements.append(f"ALTER INDEX {name} RENAME TO {original}")
+            if key is not None:
+                kind = "PRIMARY KEY" if key.contype == "p" else "UNIQUE"
+                statements.append(f"ALTER TABLE {table} ADD CONSTRAINT {key.conname} {kind} USING INDEX {original}")
+
+    # NOT VALID: checked by the validate phase without blocking writes
+    statements += [
+        f"ALTER TABLE {fk.table_name} ADD CONSTRAINT {fk.conname} {fk.definition} NOT VALID" for fk in foreign_keys
+    ]
+
+    started = time.perf_counter()
+    run(*statements)
+    print(f"  swapped {len(tables)} table(s) in {time.perf_counter() - started:.2f}s")
+
+    # The renamed columns have no planner statistics yet
+    for table in tables:
+        run_outside_transaction(f"ANALYZE {table}")
+
+
+def validate(pending):
+    """Validate foreign keys added NOT VALID by the swap."""
+    tables = sorted({table for table, _ in id_columns()})
+    # Tables added since (e.g. catalog_*) don't exist until migrate.py creates them
+    for fk in query("""
+        SELECT conrelid::regclass::text AS table_name, conname
+        FROM pg_constraint
+        WHERE contype = 'f' AND NOT convalidated
+          AND conrelid IN (SELECT to_regclass(t) FROM unnest(CAST(:tables AS text[])) AS t)
+    """, tables=tables):
+        started = time.perf_counter()
+        run(f"ALTER TABLE {fk.table_name} VALIDATE CONSTRAINT {fk.conname}")
+        print(f"  {fk.table_name}: {fk.conname} in {time.perf_counter() - started:.1f}s")
+
+
+PHASES = {
+    "expand": expand,
+    "backfill": backfill,
+    "index": build_indexes,
+    "swap": swap,
+    "validate": validate,
+}
+
+
+def migrate_uuid(phases):
+    with app.app_context():
+        for phase in phases:
+            pending = pending_columns()
+            if not pending and phase != "validate":
+                print(f"✅ {phase}: every id column is already uuid")
+                continue
+            print(f"🛠 {phase}...")
+            PHASES[phase](pending)
+        print("✅ UUID migration step(s) complete!")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert string id columns to uuid, online")
+    parser.add_argument("phase", choices=[*PHASES, "all"])
+    args = parser.parse_args()
+
+    migrate_uuid(list(PHASES) if args.phase == "all" else [args.phase])
@@ -1,26 +1,139 @@
 import uuid
 from datetime import datetime
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
+from sqlalchemy.ext.hybrid import hybrid_property
 from db import db
 
+# Postgres text-search configs for content languages; anything else is
+# indexed with "simple" (no stemming). Changing this map means dropping
+# and re-adding the search_vector columns.
+SEARCH_CONFIGS = {
+    "da": "danish", "de": "german", "en": "english", "es": "spanish", "fi": "finnish",
+    "fr": "french", "hu": "hungarian", "it": "italian", "nl": "dutch", "no": "norwegian",
+    "pt": "portuguese", "ro": "romanian", "ru": "russian", "sv": "swedish", "tr": "turkish",
+}
+
+
+def search_config_sql(language_column):
+    """SQL picking the regconfig for a row from its language column."""
+    cases = " ".join(f"WHEN '{code}' THEN '{config}'::regconfig" for code, config in SEARCH_CONFIGS.items())
+    return f"CASE {language_column} {cases} ELSE 'simple'::regconfig END"
+
+
+PROGRAM_SEARCH_SQL = (
+    f"setweight(to_tsvector({search_config_sql('language_primary')}, coalesce(title, '')), 'A') || "
+    f"setweight(to_tsvector({search_config_sql('language_primary')}, coalesce(description, '')), 'B')"
+)
+LESSON_SEARCH_SQL = f"to_tsvector({search_config_sql('content_language_primary')}, coalesce(title, ''))"
+
+# Never a real row id; malformed ids are bound as this (see UUIDString)
+NIL_ID = "00000000-0000-0000-0000-000000000000"
+
+
+def parse_id(value):
+    """Canonical string form of a UUID id, or None if value isn't one."""
+    try:
+        return str(uuid.UUID(str(value)))
+    except ValueError:
+        return None
+
+
+class UUIDString(db.TypeDecorator):
+    """Native uuid column, exchanged with Python as its canonical string.
+
+    Ids stay plain strings in the API, but keys, FKs and their indexes
+    are 16-byte uuids. Malformed ids (e.g. a mistyped URL) are bound as
+    NIL_ID, so lookups find nothing instead of failing the statement.
+    """
+    impl = db.Uuid
+    cache_ok = True
+
+    def __init__(self):
+        super().__init__(as_uuid=False)
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return parse_id(value) or NIL_ID
+
+
 # Program table
 class Program(db.Model):
     __tablename__ = "programs"
 
-    id = db.Column(db.String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = db.Column(UUIDString, primary_key=True, default=lambda: str(uuid.uuid4()))
     title = db.Column(db.String, nullable=False)
     description = db.Column(db.Text)
     language_primary = db.Column(db.String, nullable=False)
-    languages_available = db.Column(db.JSON, nullable=False)
+    # JSONB arrays of language codes, GIN-indexed for catalog ?language= filters
+    languages_available = db.Column(JSONB, nullable=False)
     status = db.Column(db.String, default="draft")  # draft, published, archived
     published_at = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Published-content rollups, kept current by catalog.refresh_program_rollups
+    published_term_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    published_lesson_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    published_duration_ms = db.Column(db.BigInteger, nullable=False, default=0, server_default="0")
+    paid_lesson_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    free_lesson_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
+    # Full-text search (title weighted above description), see catalog.search_catalog
+    search_vector = db.deferred(db.Column(TSVECTOR, db.Computed(PROGRAM_SEARCH_SQL, persisted=True)))
+
+    # Required posters present for language_primary, kept current by assets.refresh_program_readiness
+    has_portrait_poster = db.Column(db.Boolean, nullable=False, default=False, server_default="false")
+    has_landscape_poster = db.Column(db.Boolean, nullable=False, default=False, server_default="false")
+
+    __table_args__ = (
+        db.Index("ix_programs_status_language_published", "status", "language_primary", "published_at", "id"),
+        db.Index(
+            "ix_programs_languages",
+            "languages_available",
+            postgresql_using="gin",
+            postgresql_ops={"languages_available": "jsonb_path_ops"},
+            postgresql_where=db.text("published_lesson_count > 0")
+        ),
+        db.Index(
+            "ix_programs_search",
+            "search_vector",
+            postgresql_using="gin",
+            postgresql_where=db.text("published_lesson_count > 0")
+        ),
+        # Admin program list sort orders
+        db.Index("ix_programs_created_at_id", "created_at", "id"),
+        db.Index("ix_programs_title_id", "title", "id"),
+        db.Index(
+            "ix_programs_not_ready",
+            "created_at",
+            postgresql_where=db.text("NOT (has_portrait_poster AND has_landscape_poster)")
+        ),
+    )
+
+    @hybrid_property
+    def posters_ready(self):
+        return self.has_portrait_poster and self.has_landscape_poster
+
+    @posters_ready.expression
+    def posters_ready(cls):
+        return db.and_(cls.has_portrait_poster, cls.has_landscape_poster)
+
+
+# Public catalog listing: keyset order over programs with published lessons
+db.Index(
+    "ix_programs_catalog_keyset",
+    Program.published_at.desc().nulls_last(),
+    Program.id.desc(),
+    postgresql_where=Program.published_lesson_count > 0
+)
 
 
 # Topic table
 class Topic(db.Model):
     __tablename__ = "topics"
 
-    id = db.Column(db.String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = db.Column(UUIDString, primary_key=True, default=lambda: str(uuid.uuid4()))
     name = db.Column(db.String, unique=True, nullable=False)
 
 
@@ -28,19 +141,25 @@ class Topic(db.Model):
 class ProgramTopic(db.Model):
     __tablename__ = "program_topics"
 
-    program_id = db.Column(db.String, db.ForeignKey("programs.id"), primary_key=True)
-    topic_id = db.Column(db.String, db.ForeignKey("topics.id"), primary_key=True)
+    program_id = db.Column(UUIDString, db.ForeignKey("programs.id"), primary_key=True)
+    topic_id = db.Column(UUIDString, db.ForeignKey("topics.id"), primary_key=True)
+
+    __table_args__ = (
+        # Topic filters and facet counts (index-only scans by topic)
+        db.Index("ix_program_topics_topic_program", "topic_id", "program_id"),
+    )
 
 
 # Term table
 class Term(db.Model):
     __tablename__ = "terms"
 
-    id = db.Column(db.String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    program_id = db.Column(db.String, db.ForeignKey("programs.id"), nullable=False)
+    id = db.Column(UUIDString, primary_key=True, default=lambda: str(uuid.uuid4()))
+    program_id = db.Column(UUIDString, db.ForeignKey("programs.id"), nullable=False)
     term_number = db.Column(db.Integer, nullable=False)
     title = db.Column(db.String)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     __table_args__ = (
         db.UniqueConstraint('program_id', 'term_number', name='uq_program_term'),
@@ -51,8 +170,8 @@ class Term(db.Model):
 class Lesson(db.Model):
     __tablename__ = "lessons"
 
-    id = db.Column(db.String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    term_id = db.Column(db.String, db.ForeignKey("terms.id"), nullable=False)
+    id = db.Column(UUIDString, primary_key=True, default=lambda: str(uuid.uuid4()))
+    term_id = db.Column(UUIDString, db.ForeignKey("terms.id"), nullable=False)
     lesson_number = db.Column(db.Integer, nullable=False)
     title = db.Column(db.String, nullable=False)
     content_type = db.Column(db.String, nullable=False)  # video, article
@@ -60,30 +179,84 @@ class Lesson(db.Model):
     is_paid = db.Column(db.Boolean, default=False)
 
     content_language_primary = db.Column(db.String, nullable=False)
-    content_languages_available = db.Column(db.JSON, nullable=False)
+    content_languages_available = db.Column(JSONB, nullable=False)
     content_urls_by_language = db.Column(db.JSON, nullable=False)
 
-    subtitle_languages = db.Column(db.JSON)
+    subtitle_languages = db.Column(JSONB)
     subtitle_urls_by_language = db.Column(db.JSON)
 
     status = db.Column(db.String, default="draft")  # draft, scheduled, published, archived
     publish_at = db.Column(db.DateTime)
     published_at = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    search_vector = db.deferred(db.Column(TSVECTOR, db.Computed(LESSON_SEARCH_SQL, persisted=True)))
+
+    # Required thumbnails present for content_language_primary, kept current by assets.refresh_lesson_readiness
+    has_portrait_thumbnail = db.Column(db.Boolean, nullable=False, default=False, server_default="false")
+    has_landscape_thumbnail = db.Column(db.Boolean, nullable=False, default=False, server_default="false")
+    # When both thumbnails last became present (NULL while either is missing)
+    ready_at = db.Column(db.DateTime)
 
     __table_args__ = (
         db.UniqueConstraint('term_id', 'lesson_number', name='uq_term_lesson'),
+        db.Index("ix_lessons_status_publish_at", "status", "publish_at"),
+        # Worker "next due" lookup: MIN(publish_at) over publishable scheduled lessons only
+        db.Index(
+            "ix_lessons_scheduled_ready_publish_at",
+            "publish_at",
+            postgresql_where=db.text(
+                "status = 'scheduled' AND has_portrait_thumbnail AND has_landscape_thumbnail"
+            )
+        ),
+        db.Index(
+            "ix_lessons_languages",
+            "content_languages_available",
+            postgresql_using="gin",
+            postgresql_ops={"content_languages_available": "jsonb_path_ops"},
+            postgresql_where=db.text("status = 'published'")
+        ),
+        db.Index(
+            "ix_lessons_subtitles",
+            "subtitle_languages",
+            postgresql_using="gin",
+            postgresql_ops={"subtitle_languages": "jsonb_path_ops"},
+            postgresql_where=db.text("status = 'published'")
+        ),
+        db.Index(
+            "ix_lessons_search",
+            "search_vector",
+            postgresql_using="gin",
+            postgresql_where=db.text("status = 'published'")
+        ),
+        db.Index(
+            "ix_lessons_not_ready",
+            "term_id",
+            postgresql_where=db.text(
+                "status IN ('draft', 'scheduled') AND NOT (has_portrait_thumbnail AND has_landscape_thumbnail)"
+            )
+        ),
     )
 
+    @hybrid_property
+    def thumbnails_ready(self):
+        return self.has_portrait_thumbnail and self.has_landscape_thumbnail
+
+    @thumbnails_ready.expression
+    def thumbnails_ready(cls):
+        return db.and_(cls.has_portrait_thumbnail, cls.has_landscape_thumbnail)
+
 class ProgramAsset(db.Model):
     __tablename__ = "program_assets"
 
-    id = db.Column(db.String, primary_key=True)
-    program_id = db.Column(db.String, db.ForeignKey("programs.id"), nullable=False)
+    id = db.Column(UUIDString, primary_key=True)
+    program_id = db.Column(UUIDString, db.ForeignKey("programs.id"), nullable=False)
     language = db.Column(db.String, nullable=False)
     variant = db.Column(db.String, nullable=False)  # portrait | landscape | square | banner
     asset_type = db.Column(db.String, nullable=False)  # poster
     url = db.Column(db.String, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     __table_args__ = (
         db.UniqueConstraint("program_id", "language", "variant", "asset_type", name="uniq_program_asset"),
@@ -93,13 +266,60 @@ class ProgramAsset(db.Model):
 class LessonAsset(db.Model):
     __tablename__ = "lesson_assets"
 
-    id = db.Column(db.String, primary_key=True)
-    lesson_id = db.Column(db.String, db.ForeignKey("lessons.id"), nullable=False)
+    id = db.Column(UUIDString, primary_key=True)
+    lesson_id = db.Column(UUIDString, db.ForeignKey("lessons.id"), nullable=False)
     language = db.Column(db.String, nullable=False)
     variant = db.Column(db.String, nullable=False)  # portrait | landscape | square | banner
     asset_type = db.Column(db.String, nullable=False)  # thumbnail
     url = db.Column(db.String, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     __table_args__ = (
         db.UniqueConstraint("lesson_id", "language", "variant", "asset_type", name="uniq_lesson_asset"),
     )
+
+
+# Pre-serialized public catalog documents (see catalog.rebuild_program_documents)
+class CatalogDocument(db.Model):
+    __tablename__ = "catalog_documents"
+
+    program_id = db.Column(UUIDString, db.ForeignKey("programs.id"), primary_key=True)
+    document = db.Column(db.Text, nullable=False)
+    built_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    # Next scheduled go-live in the program, when the document stops being
+    # current (read-time publishing only, see catalog.program_document)
+    expires_at = db.Column(db.DateTime)
+
+
+class CatalogLessonDocument(db.Model):
+    __tablename__ = "catalog_lesson_documents"
+
+    lesson_id = db.Column(UUIDString, db.ForeignKey("lessons.id"), primary_key=True)
+    program_id = db.Column(UUIDString, db.ForeignKey("programs.id"), nullable=False, index=True)
+    document = db.Column(db.Text, nullable=False)
+
+
+# Change feed: one row per catalog entity, re-stamped whenever its public
+# document changes or it leaves the catalog (deleted = tombstone).
+# change_xid is the writing transaction's id, see catalog.list_changes.
+class CatalogChange(db.Model):
+    __tablename__ = "catalog_changes"
+
+    entity_type = db.Column(db.String, primary_key=True)  # program, lesson
+    entity_id = db.Column(UUIDString, primary_key=True)
+    program_id = db.Column(UUIDString, nullable=False)
+    change_xid = db.Column(db.BigInteger, nullable=False)
+    changed_at = db.Column(db.DateTime, nullable=False)
+    deleted = db.Column(db.Boolean, nullable=False, default=False)
+
+    __table_args__ = (
+        db.Index("ix_catalog_changes_watermark", "change_xid", "entity_type", "entity_id"),
+    )
+
+
+# Programs whose documents must be rebuilt by the API (queued by the worker)
+class CatalogRebuildQueue(db.Model):
+    __tablename__ = "catalog_rebuild_queue"
+
+    program_id = db.Column(UUIDString, primary_key=True)
+    queued_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
@@ -0,0 +1,96 @@
+from datetime import datetime
+
+from db import db
+from models import Term, Lesson, parse_id
+from catalog import on_programs_changed
+
+
+def notify_schedule_changed():
+    # Wakes the worker so it re-reads the earliest publish_at (delivered on commit)
+    db.session.execute(db.text("SELECT pg_notify('lesson_schedule_changed', '')"))
+
+
+def missing_thumbnails(lesson):
+    missing = []
+    if not lesson.has_portrait_thumbnail:
+        missing.append("portrait")
+    if not lesson.has_landscape_thumbnail:
+        missing.append("landscape")
+    return missing
+
+
+def candidates_query():
+    return db.session.query(
+        Lesson.id, Lesson.status, Lesson.has_portrait_thumbnail, Lesson.has_landscape_thumbnail,
+        Term.program_id
+    ).join(Term, Lesson.term_id == Term.id)
+
+
+def classify(candidates):
+    """Split candidates into publishable ids and skipped report entries."""
+    eligible, skipped = [], []
+    for candidate in candidates:
+        missing = missing_thumbnails(candidate)
+        if candidate.status == "published":
+            skipped.append({"id": candidate.id, "reason": "ALREADY_PUBLISHED"})
+        elif candidate.status == "archived":
+            skipped.append({"id": candidate.id, "reason": "ARCHIVED"})
+        elif missing:
+            skipped.append({"id": candidate.id, "reason": "ASSETS_MISSING", "missing_thumbnails": missing})
+        else:
+            eligible.append(candidate.id)
+    return eligible, skipped
+
+
+def bulk_publish_lessons(term_id=None, program_id=None, lesson_ids=None):
+    """Publish every eligible lesson in a term, a program or an explicit list.
+
+    Given both a term and a program, only lessons of that term in that
+    program are candidates.
+
+    Runs a fixed number of statements regardless of size: candidates
+    (with their readiness flags), one UPDATE for the eligible lessons,
+    then the catalog refresh. Returns a per-lesson report; the caller
+    commits.
+    """
+    query = candidates_query()
+    if term_id:
+        query = query.filter(Lesson.term_id == term_id)
+    if program_id:
+        query = query.filter(Term.program_id == program_id)
+    if not (term_id or program_id):
+        # Canonical ids, so the NOT_FOUND check below matches what the query returns
+        lesson_ids = list(dict.fromkeys(parse_id(lid) or lid for lid in lesson_ids))
+        query = query.filter(Lesson.id.in_(lesson_ids))
+
+    candidates = query.order_by(Term.term_number, Lesson.lesson_number).all()
+    eligible, skipped = classify(candidates)
+
+    if lesson_ids:
+        found = {c.id for c in candidates}
+        skipped.extend({"id": lid, "reason": "NOT_FOUND"} for lid in lesson_ids if lid not in found)
+
+    published = []
+    if eligible:
+        # Re-checked here: a lesson published, archived or stripped of a
+        # thumbnail since the read above is left alone
+        now = datetime.utcnow()
+        updated = set(db.session.execute(
+            db.update(Lesson)
+            .where(Lesson.id.in_(eligible), Lesson.status.in_(("draft", "scheduled")), Lesson.thumbnails_ready)
+            .values(status="published", published_at=now, updated_at=now)
+            .returning(Lesson.id)
+            .execution_options(synchronize_session=False)
+        ).scalars())
+        published = [c.id for c in candidates if c.id in updated]
+
+        # Lost a race: report what they are now
+        raced = [lid for lid in eligible if lid not in updated]
+        if raced:
+            skipped.extend(classify(candidates_query().filter(Lesson.id.in_(raced)).all())[1])
+
+        if published:
+            on_programs_changed({c.program_id for c in candidates if c.id in updated})
+
+    return {"published": published, "skipped": skipped}
+
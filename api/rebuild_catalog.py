@@ -0,0 +1,11 @@
+from app import app
+from catalog import rebuild_all_documents
+
+def rebuild():
+    with app.app_context():
+        print("🔁 Rebuilding catalog documents...")
+        count = rebuild_all_documents()
+        print(f"✅ Rebuilt documents for {count} program(s)")
+
+if __name__ == "__main__":
+    rebuild()
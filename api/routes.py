@@ -1,9 +1,21 @@
-from flask import Blueprint, request, jsonify, session, redirect, render_template, url_for, flash
-from db import db
-from models import Program, Term, Lesson, ProgramAsset, LessonAsset
+from flask import (
+    Blueprint, Response, abort, request, jsonify, session, redirect, render_template,
+    stream_template, url_for, flash
+)
+from db import db, replica_reads
+from metrics import query_budget
+from models import Program, Term, Lesson, Topic, ProgramTopic, parse_id
+from assets import upsert_asset, upsert_asset_batch, validate_asset_batch
+from cache import catalog_cache, fragment_cache
+from publishing import bulk_publish_lessons, notify_schedule_changed
+from catalog import (
+    CHANGES_PAGE_SIZE, MAX_CHANGES_PAGE_SIZE, READ_TIME_PUBLISHING, CatalogQueryError, iter_catalog_tree,
+    lesson_document, list_changes, list_programs, on_programs_changed, parse_limit,
+    parse_topics, program_document, search_catalog
+)
 from datetime import datetime
-import uuid
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import load_only
 
 api_routes = Blueprint("api", __name__)
 
@@ -12,25 +24,18 @@ api_routes = Blueprint("api", __name__)
 # -----------------------
 
 def program_has_required_posters(program):
-    assets = ProgramAsset.query.filter_by(
-        program_id=program.id,
-        language=program.language_primary,
-        asset_type="poster"
-    ).all()
-
-    variants = {a.variant for a in assets}
-    return "portrait" in variants and "landscape" in variants
+    # Flags are maintained on every asset write (see assets.refresh_program_readiness)
+    return program.posters_ready
 
 
 def lesson_has_required_thumbnails(lesson):
-    assets = LessonAsset.query.filter_by(
-        lesson_id=lesson.id,
-        language=lesson.content_language_primary,
-        asset_type="thumbnail"
-    ).all()
+    return lesson.thumbnails_ready
 
-    variants = {a.variant for a in assets}
-    return "portrait" in variants and "landscape" in variants
+
+def lesson_program_id(lesson_id):
+    return db.session.query(Term.program_id).join(Lesson, Lesson.term_id == Term.id).filter(
+        Lesson.id == lesson_id
+    ).scalar()
 
 
 # -----------------------
@@ -68,6 +73,14 @@ def create_term():
 @api_routes.route("/lessons", methods=["POST"])
 def create_lesson():
     data = request.json
+
+    publish_at = None
+    if data.get("publish_at"):
+        try:
+            publish_at = datetime.fromisoformat(data["publish_at"])
+        except ValueError:
+            return jsonify({"code": "INVALID_PUBLISH_AT", "message": "publish_at must be an ISO 8601 datetime"}), 400
+
     lesson = Lesson(
         term_id=data["term_id"],
         lesson_number=data["lesson_number"],
@@ -78,9 +91,12 @@ def create_lesson():
         content_language_primary=data["content_language_primary"],
         content_languages_available=data["content_languages_available"],
         content_urls_by_language=data["content_urls_by_language"],
-        status="draft"
+        status="scheduled" if publish_at else "draft",
+        publish_at=publish_at
     )
     db.session.add(lesson)
+    if publish_at:
+        notify_schedule_changed()
     db.session.commit()
     return jsonify({"message": "Lesson created", "id": lesson.id})
 
@@ -104,11 +120,73 @@ def publish_lesson(lesson_id):
 
     lesson.status = "published"
     lesson.published_at = datetime.utcnow()
+    on_programs_changed([lesson_program_id(lesson.id)])
     db.session.commit()
 
     return jsonify({"message": "Lesson published"})
 
 
+@api_routes.route("/lessons/publish/bulk", methods=["POST"])
+def bulk_publish():
+    data = request.json or {}
+    scopes = [key for key in ("term_id", "program_id", "lesson_ids") if data.get(key)]
+
+    if len(scopes) != 1:
+        return jsonify({
+            "code": "INVALID_SCOPE",
+            "message": "Provide exactly one of term_id, program_id or lesson_ids"
+        }), 400
+
+    lesson_ids = data.get("lesson_ids")
+    if lesson_ids is not None and not (
+        isinstance(lesson_ids, list) and all(isinstance(lid, str) for lid in lesson_ids)
+    ):
+        return jsonify({"code": "INVALID_SCOPE", "message": "lesson_ids must be a list of ids"}), 400
+
+    if data.get("term_id") and not db.session.scalar(db.select(Term.id).where(Term.id == data["term_id"])):
+        return jsonify({"code": "NOT_FOUND", "message": "Term not found"}), 404
+    if data.get("program_id") and not db.session.scalar(db.select(Program.id).where(Program.id == data["program_id"])):
+        return jsonify({"code": "NOT_FOUND", "message": "Program not found"}), 404
+
+    report = bulk_publish_lessons(
+        term_id=data.get("term_id"),
+        program_id=data.get("program_id"),
+        lesson_ids=lesson_ids
+    )
+    db.session.commit()
+
+    return jsonify({"message": f"Published {len(report['published'])} lesson(s)", **report})
+
+
+@api_routes.route("/lessons/<lesson_id>/schedule", methods=["POST"])
+def schedule_lesson(lesson_id):
+    lesson = Lesson.query.get(lesson_id)
+
+    if not lesson:
+        return jsonify({"code": "NOT_FOUND", "message": "Lesson not found"}), 404
+
+    if lesson.status not in ("draft", "scheduled"):
+        return jsonify({
+            "code": "INVALID_STATUS",
+            "message": "Only draft or scheduled lessons can be scheduled"
+        }), 400
+
+    try:
+        publish_at = datetime.fromisoformat(request.json["publish_at"])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"code": "INVALID_PUBLISH_AT", "message": "publish_at must be an ISO 8601 datetime"}), 400
+
+    lesson.status = "scheduled"
+    lesson.publish_at = publish_at
+    notify_schedule_changed()
+    if READ_TIME_PUBLISHING:
+        # The catalog goes live at publish_at itself: documents need the new expiry
+        on_programs_changed([lesson_program_id(lesson.id)])
+    db.session.commit()
+
+    return jsonify({"message": "Lesson scheduled", "publish_at": publish_at.isoformat()})
+
+
 @api_routes.route("/programs/<program_id>/publish", methods=["POST"])
 def publish_program(program_id):
     program = Program.query.get(program_id)
@@ -126,10 +204,59 @@ def publish_program(program_id):
     if not program.published_at:
         program.published_at = datetime.utcnow()
 
+    on_programs_changed([program.id])
     db.session.commit()
     return jsonify({"message": "Program published"})
 
 
+@api_routes.route("/lessons/<lesson_id>/unpublish", methods=["POST"])
+def unpublish_lesson(lesson_id):
+    lesson = Lesson.query.get(lesson_id)
+
+    if not lesson:
+        return jsonify({"code": "NOT_FOUND", "message": "Lesson not found"}), 404
+
+    if lesson.status != "published":
+        return jsonify({"code": "INVALID_STATUS", "message": "Only published lessons can be unpublished"}), 400
+
+    lesson.status = "draft"
+    lesson.published_at = None
+    on_programs_changed([lesson_program_id(lesson.id)])
+    db.session.commit()
+
+    return jsonify({"message": "Lesson unpublished"})
+
+
+@api_routes.route("/lessons/<lesson_id>/archive", methods=["POST"])
+def archive_lesson(lesson_id):
+    lesson = Lesson.query.get(lesson_id)
+
+    if not lesson:
+        return jsonify({"code": "NOT_FOUND", "message": "Lesson not found"}), 404
+
+    lesson.status = "archived"
+    lesson.publish_at = None
+    on_programs_changed([lesson_program_id(lesson.id)])
+    db.session.commit()
+
+    return jsonify({"message": "Lesson archived"})
+
+
+@api_routes.route("/programs/<program_id>/archive", methods=["POST"])
+def archive_program(program_id):
+    program = Program.query.get(program_id)
+
+    if not program:
+        return jsonify({"code": "NOT_FOUND", "message": "Program not found"}), 404
+
+    # Archived programs drop out of the catalog; publishing restores them
+    program.status = "archived"
+    on_programs_changed([program.id])
+    db.session.commit()
+
+    return jsonify({"message": "Program archived"})
+
+
 # -----------------------
 # ASSET MANAGEMENT (API)
 # -----------------------
@@ -138,38 +265,107 @@ def publish_program(program_id):
 def add_program_asset(program_id):
     data = request.json
 
-    asset = ProgramAsset(
-        id=str(uuid.uuid4()),
-        program_id=program_id,
-        language=data["language"],
-        variant=data["variant"],
-        asset_type="poster",
-        url=data["url"]
-    )
-
-    db.session.add(asset)
+    # Replaces the url if this language/variant poster already exists
+    asset_id = upsert_asset("program", program_id, data["language"], data["variant"], data["url"])
+    on_programs_changed([program_id])
     db.session.commit()
 
-    return jsonify({"message": "Program asset added", "id": asset.id})
+    return jsonify({"message": "Program asset added", "id": asset_id})
 
 
 @api_routes.route("/lessons/<lesson_id>/assets", methods=["POST"])
 def add_lesson_asset(lesson_id):
     data = request.json
 
-    asset = LessonAsset(
-        id=str(uuid.uuid4()),
-        lesson_id=lesson_id,
-        language=data["language"],
-        variant=data["variant"],
-        asset_type="thumbnail",
-        url=data["url"]
-    )
+    asset_id = upsert_asset("lesson", lesson_id, data["language"], data["variant"], data["url"])
+    on_programs_changed([lesson_program_id(lesson_id)])
+    db.session.commit()
+
+    return jsonify({"message": "Lesson asset added", "id": asset_id})
+
+
+def batch_upsert_assets(kind):
+    rows, program_ids, errors = validate_asset_batch(kind, (request.json or {}).get("assets"))
 
-    db.session.add(asset)
+    if errors:
+        return jsonify({
+            "code": "VALIDATION_FAILED",
+            "message": f"{len(errors)} problem(s) found; nothing was saved",
+            "errors": errors
+        }), 400
+
+    upsert_asset_batch(kind, rows)
+    on_programs_changed(program_ids)
     db.session.commit()
 
-    return jsonify({"message": "Lesson asset added", "id": asset.id})
+    return jsonify({"message": "Assets saved", "count": len(rows)})
+
+
+@api_routes.route("/programs/assets/batch", methods=["POST"])
+def batch_program_assets():
+    return batch_upsert_assets("program")
+
+
+@api_routes.route("/lessons/assets/batch", methods=["POST"])
+def batch_lesson_assets():
+    return batch_upsert_assets("lesson")
+
+
+# -----------------------
+# TOPICS (API)
+# -----------------------
+
+@api_routes.route("/topics", methods=["GET"])
+@query_budget(1)
+def list_topics():
+    topics = Topic.query.order_by(Topic.name).all()
+    return jsonify({"data": [{"id": topic.id, "name": topic.name} for topic in topics]})
+
+
+@api_routes.route("/topics", methods=["POST"])
+def create_topic():
+    name = ((request.json or {}).get("name") or "").strip()
+    if not name:
+        return jsonify({"code": "VALIDATION_FAILED", "message": "name is required"}), 400
+
+    topic = Topic(name=name)
+    db.session.add(topic)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"code": "CONFLICT", "message": f"Topic {name!r} already exists"}), 409
+
+    return jsonify({"message": "Topic created", "id": topic.id})
+
+
+@api_routes.route("/programs/<program_id>/topics", methods=["PUT"])
+def set_program_topics(program_id):
+    """Replace a program's topics with the given list of topic ids."""
+    topic_ids = (request.json or {}).get("topic_ids")
+    if not isinstance(topic_ids, list) or not all(isinstance(tid, str) for tid in topic_ids):
+        return jsonify({"code": "VALIDATION_FAILED", "message": "topic_ids must be a list of topic ids"}), 400
+    topic_ids = list(dict.fromkeys(parse_id(tid) or tid for tid in topic_ids))
+
+    if not Program.query.get(program_id):
+        return jsonify({"code": "NOT_FOUND", "message": "Program not found"}), 404
+
+    found = set(db.session.scalars(db.select(Topic.id).where(Topic.id.in_(topic_ids))))
+    unknown = [tid for tid in topic_ids if tid not in found]
+    if unknown:
+        return jsonify({"code": "NOT_FOUND", "message": "Unknown topic(s)", "topic_ids": unknown}), 404
+
+    # One delete and one batched insert, whatever the size of the change
+    ProgramTopic.query.filter(ProgramTopic.program_id == program_id).delete(synchronize_session=False)
+    if topic_ids:
+        db.session.execute(
+            db.insert(ProgramTopic),
+            [{"program_id": program_id, "topic_id": tid} for tid in topic_ids]
+        )
+    on_programs_changed([program_id])
+    db.session.commit()
+
+    return jsonify({"message": "Program topics updated", "topic_ids": topic_ids})
 
 
 # -------------------------------
@@ -177,29 +373,103 @@ def add_lesson_asset(lesson_id):
 # -------------------------------
 
 @api_routes.route("/catalog/programs", methods=["GET"])
+@query_budget(2)
+@replica_reads
 def list_catalog_programs():
-    query = db.session.query(Program).join(Term).join(Lesson).filter(
-        Lesson.status == "published"
-    ).group_by(Program.id).order_by(Program.published_at.desc())
-
-    programs = query.all()
-
-    result = []
-    for program in programs:
-        term_count = Term.query.filter_by(program_id=program.id).count()
-        lesson_count = db.session.query(Lesson).join(Term).filter(
-            Term.program_id == program.id,
-            Lesson.status == "published"
-        ).count()
-
-        result.append({
-            "id": program.id,
-            "title": program.title,
-            "term_count": term_count,
-            "lesson_count": lesson_count
-        })
+    params = dict(
+        limit=request.args.get("limit"),
+        cursor=request.args.get("cursor"),
+        language_primary=request.args.get("language_primary"),
+        status=request.args.get("status"),
+        topics=parse_topics(request.args.getlist("topic")),
+        language=request.args.get("language"),
+        subtitle=request.args.get("subtitle")
+    )
+
+    try:
+        params["limit"] = parse_limit(params["limit"])
+        page = catalog_cache.get_or_build(
+            ("programs", tuple(sorted(params.items()))),
+            lambda: list_programs(**params),
+            tags=("programs",)
+        )
+    except CatalogQueryError as e:
+        return jsonify({"code": e.code, "message": e.message}), 400
+
+    return jsonify(page)
+
+
+@api_routes.route("/catalog/search", methods=["GET"])
+@query_budget(1)
+@replica_reads
+def search_catalog_content():
+    # Not cached: free-text queries would only churn the LRU
+    try:
+        limit = parse_limit(request.args.get("limit"))
+        results = search_catalog(
+            request.args.get("q"), request.args.get("lang"), limit, request.args.get("cursor"),
+            request.args.get("language"), request.args.get("subtitle")
+        )
+    except CatalogQueryError as e:
+        return jsonify({"code": e.code, "message": e.message}), 400
+
+    return jsonify(results)
+
+
+@api_routes.route("/catalog/changes", methods=["GET"])
+@query_budget(1)
+def list_catalog_changes():
+    # Not cached or replica-routed: the cursor is only safe against the primary's transaction state
+    try:
+        limit = parse_limit(request.args.get("limit"), CHANGES_PAGE_SIZE, MAX_CHANGES_PAGE_SIZE)
+        changes = list_changes(request.args.get("since"), limit)
+    except CatalogQueryError as e:
+        return jsonify({"code": e.code, "message": e.message}), 400
+
+    return jsonify(changes)
+
+
+# Read-time publishing renders out-of-date documents live (see catalog.program_document)
+@api_routes.route("/catalog/programs/<program_id>", methods=["GET"])
+@query_budget(5 if READ_TIME_PUBLISHING else 1)
+@replica_reads
+def get_catalog_program(program_id):
+    # Canonical id, so the cache entry carries the tag invalidations use
+    program_id = parse_id(program_id)
+    if program_id is None:
+        return jsonify({"code": "NOT_FOUND", "message": "Program not found"}), 404
+
+    # Served straight from the pre-rendered document, no ORM hydration
+    document = catalog_cache.get_or_build(
+        ("program", program_id),
+        lambda: program_document(program_id),
+        tags=(f"program:{program_id}",)
+    )
 
-    return jsonify({"data": result})
+    if not document:
+        return jsonify({"code": "NOT_FOUND", "message": "Program not found"}), 404
+
+    return Response(document, mimetype="application/json")
+
+
+@api_routes.route("/catalog/lessons/<lesson_id>", methods=["GET"])
+@query_budget(3 if READ_TIME_PUBLISHING else 1)
+@replica_reads
+def get_catalog_lesson(lesson_id):
+    lesson_id = parse_id(lesson_id)
+    if lesson_id is None:
+        return jsonify({"code": "NOT_FOUND", "message": "Lesson not found"}), 404
+
+    row = catalog_cache.get_or_build(
+        ("lesson", lesson_id),
+        lambda: lesson_document(lesson_id),
+        tags=lambda row: (f"program:{row[0]}",)
+    )
+
+    if not row:
+        return jsonify({"code": "NOT_FOUND", "message": "Lesson not found"}), 404
+
+    return Response(row[1], mimetype="application/json")
 
 
 # --------------------
@@ -207,36 +477,112 @@ def list_catalog_programs():
 # --------------------
 
 @api_routes.route("/dashboard")
+@query_budget(0)
 def dashboard():
     if "user" not in session:
         return redirect("/login")
     return render_template("dashboard.html", role=session.get("role"))
 
 
+# Sort keys for the admin program list; id breaks ties so pages are stable
+PROGRAM_SORTS = {
+    "created": Program.created_at,
+    "title": Program.title,
+    "status": Program.status,
+    "lessons": Program.published_lesson_count,
+}
+PROGRAMS_PER_PAGE = 25
+
+
 @api_routes.route("/ui/programs")
+@query_budget(2)
 def ui_programs():
     if "user" not in session or session.get("role") != "admin":
         return redirect("/dashboard")
 
-    programs = Program.query.all()
-    return render_template("programs.html", programs=programs)
+    q = request.args.get("q", "").strip()
+    sort = request.args.get("sort", "created")
+    if sort not in PROGRAM_SORTS:
+        sort = "created"
+    direction = "asc" if request.args.get("dir") == "asc" else "desc"
+
+    # Only the columns the list renders; the JSON columns stay in the table
+    query = db.select(Program).options(load_only(
+        Program.id, Program.title, Program.status, Program.language_primary,
+        Program.published_lesson_count, Program.created_at
+    ))
+    if q:
+        # q is matched literally: its %, _ and \ aren't LIKE wildcards
+        pattern = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        query = query.where(Program.title.ilike(f"%{pattern}%", escape="\\"))
+
+    column = PROGRAM_SORTS[sort]
+    if direction == "asc":
+        query = query.order_by(column.asc(), Program.id.asc())
+    else:
+        query = query.order_by(column.desc(), Program.id.desc())
+
+    page = db.paginate(query, per_page=PROGRAMS_PER_PAGE, max_per_page=100, error_out=False)
+    return render_template("programs.html", page=page, q=q, sort=sort, direction=direction)
 
 
 @api_routes.route("/ui/programs/<program_id>")
+@query_budget(2)
 def ui_program_detail(program_id):
     if "user" not in session or session.get("role") != "admin":
         return redirect("/dashboard")
 
-    program = Program.query.get_or_404(program_id)
-    terms = Term.query.filter_by(program_id=program.id).order_by(Term.term_number).all()
+    program = db.session.execute(
+        db.select(
+            Program.id, Program.title, Program.status, Program.language_primary
+        ).where(Program.id == program_id)
+    ).first()
+    if not program:
+        abort(404)
+
+    # Every term and lesson in one query, grouped into terms here
+    rows = db.session.execute(
+        db.select(
+            Term.id, Term.term_number, Term.title,
+            Lesson.id.label("lesson_id"), Lesson.lesson_number,
+            Lesson.title.label("lesson_title"), Lesson.status
+        ).outerjoin(Lesson, Lesson.term_id == Term.id)
+        .where(Term.program_id == program_id)
+        .order_by(Term.term_number, Lesson.lesson_number)
+    ).all()
+
+    terms = {}
+    for row in rows:
+        term = terms.setdefault(row.id, {
+            "id": row.id, "term_number": row.term_number, "title": row.title, "lessons": []
+        })
+        if row.lesson_id:
+            term["lessons"].append({
+                "id": row.lesson_id, "lesson_number": row.lesson_number,
+                "title": row.lesson_title, "status": row.status
+            })
+
+    return render_template("program_detail.html", program=program, terms=list(terms.values()))
 
-    for term in terms:
-        term.lessons = Lesson.query.filter_by(term_id=term.id).order_by(Lesson.lesson_number).all()
 
-    return render_template("program_detail.html", program=program, terms=terms)
+@api_routes.route("/ui/not-ready")
+@query_budget(2)
+def ui_not_ready():
+    if "user" not in session or session.get("role") != "admin":
+        return redirect("/dashboard")
+
+    # Both lists are served by the partial "not ready" indexes
+    programs = Program.query.filter(~Program.posters_ready).order_by(Program.created_at.desc()).limit(200).all()
+    lessons = db.session.query(Lesson, Term).join(Term, Lesson.term_id == Term.id).filter(
+        Lesson.status.in_(["draft", "scheduled"]),
+        ~Lesson.thumbnails_ready
+    ).order_by(Lesson.publish_at.nulls_last(), Lesson.created_at).limit(200).all()
+
+    return render_template("not_ready.html", programs=programs, lessons=lessons)
 
 
 @api_routes.route("/ui/lessons/<lesson_id>")
+@query_budget(1)
 def ui_lesson_detail(lesson_id):
     if "user" not in session or session.get("role") != "admin":
         return redirect("/dashboard")
@@ -259,6 +605,7 @@ def ui_publish_lesson(lesson_id):
 
     lesson.status = "published"
     lesson.published_at = datetime.utcnow()
+    on_programs_changed([lesson_program_id(lesson.id)])
     db.session.commit()
 
     flash("Lesson published!", "success")
@@ -277,11 +624,30 @@ def ui_publish_program(program_id):
     if not program.published_at:
         program.published_at = datetime.utcnow()
 
+    on_programs_changed([program.id])
     db.session.commit()
     flash("Program published!", "success")
     return redirect(url_for("api.ui_program_detail", program_id=program.id))
 
 
+@api_routes.route("/ui/programs/<program_id>/publish-lessons", methods=["POST"])
+def ui_bulk_publish_lessons(program_id):
+    term_id = request.form.get("term_id")
+    if not db.session.get(Program, program_id):
+        abort(404)
+    # A stale or tampered form must not publish another program's term
+    if term_id and not db.session.scalar(
+        db.select(Term.id).where(Term.id == term_id, Term.program_id == program_id)
+    ):
+        abort(404)
+
+    report = bulk_publish_lessons(term_id=term_id or None, program_id=program_id)
+    db.session.commit()
+
+    flash(f"Published {len(report['published'])} lesson(s), skipped {len(report['skipped'])}", "success")
+    return redirect(url_for("api.ui_program_detail", program_id=program_id))
+
+
 # -----------------------
 # UI CREATION
 # -----------------------
@@ -357,6 +723,8 @@ def ui_create_lesson(term_id):
 
         try:
             db.session.add(lesson)
+            if status == "scheduled":
+                notify_schedule_changed()
             db.session.commit()
             return redirect("/ui/programs")
         except IntegrityError:
@@ -376,15 +744,8 @@ def ui_create_lesson(term_id):
 
 @api_routes.route("/ui/programs/<program_id>/assets", methods=["POST"])
 def ui_add_program_asset(program_id):
-    asset = ProgramAsset(
-        id=str(uuid.uuid4()),
-        program_id=program_id,
-        language=request.form["language"],
-        variant=request.form["variant"],
-        asset_type="poster",
-        url=request.form["url"]
-    )
-    db.session.add(asset)
+    upsert_asset("program", program_id, request.form["language"], request.form["variant"], request.form["url"])
+    on_programs_changed([program_id])
     db.session.commit()
     flash("Poster added!", "success")
     return redirect(url_for("api.ui_program_detail", program_id=program_id))
@@ -392,15 +753,8 @@ def ui_add_program_asset(program_id):
 
 @api_routes.route("/ui/lessons/<lesson_id>/assets", methods=["POST"])
 def ui_add_lesson_asset(lesson_id):
-    asset = LessonAsset(
-        id=str(uuid.uuid4()),
-        lesson_id=lesson_id,
-        language=request.form["language"],
-        variant=request.form["variant"],
-        asset_type="thumbnail",
-        url=request.form["url"]
-    )
-    db.session.add(asset)
+    upsert_asset("lesson", lesson_id, request.form["language"], request.form["variant"], request.form["url"])
+    on_programs_changed([lesson_program_id(lesson_id)])
     db.session.commit()
     flash("Thumbnail added!", "success")
     return redirect(url_for("api.ui_lesson_detail", lesson_id=lesson_id))
@@ -411,33 +765,15 @@ def ui_add_lesson_asset(lesson_id):
 # -----------------------
 
 @api_routes.route("/catalog-ui")
+@query_budget(1)
 def catalog_ui():
-    programs = db.session.query(Program).join(Term).join(Lesson).filter(
-        Lesson.status == "published"
-    ).group_by(Program.id).all()
-
-    data = []
-    for program in programs:
-        terms = Term.query.filter_by(program_id=program.id).order_by(Term.term_number).all()
-        term_data = []
-
-        for term in terms:
-            lessons = Lesson.query.filter_by(
-                term_id=term.id,
-                status="published"
-            ).order_by(Lesson.lesson_number).all()
-
-            if lessons:
-                term_data.append({
-                    "term_number": term.term_number,
-                    "term_title": term.title,
-                    "lessons": lessons
-                })
-
-        data.append({
-            "id": program.id,
-            "title": program.title,
-            "terms": term_data
-        })
+    def fragments():
+        # Rendered per-program HTML is cached until that program changes
+        for program in iter_catalog_tree():
+            yield fragment_cache.get_or_build(
+                program["id"],
+                lambda: render_template("catalog_program.html", program=program),
+                tags=(f"program:{program['id']}",)
+            )
 
-    return render_template("catalog.html", programs=data)
+    return stream_template("catalog.html", fragments=fragments())
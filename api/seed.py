@@ -1,6 +1,11 @@
 from app import app
 from db import db
-from models import Program, Term, Lesson, ProgramAsset, LessonAsset
+from models import (
+    Program, Term, Lesson, ProgramAsset, LessonAsset, Topic, ProgramTopic,
+    CatalogChange, CatalogDocument, CatalogLessonDocument, CatalogRebuildQueue
+)
+from assets import refresh_lesson_readiness, refresh_program_readiness
+from catalog import rebuild_program_documents, refresh_program_rollups
 from datetime import datetime, timedelta
 import uuid
 
@@ -9,8 +14,14 @@ def seed():
         print("🌱 Seeding database...")
 
         # Clear existing data (order matters due to FKs)
+        CatalogRebuildQueue.query.delete()
+        CatalogChange.query.delete()
+        CatalogLessonDocument.query.delete()
+        CatalogDocument.query.delete()
         LessonAsset.query.delete()
         ProgramAsset.query.delete()
+        ProgramTopic.query.delete()
+        Topic.query.delete()
         Lesson.query.delete()
         Term.query.delete()
         Program.query.delete()
@@ -184,6 +195,11 @@ def seed():
             content_language_primary="en",
             content_languages_available=["en"],
             content_urls_by_language={"en": "https://example.com/ai2"},
+            subtitle_languages=["en", "ta"],
+            subtitle_urls_by_language={
+                "en": "https://example.com/ai2_en.vtt",
+                "ta": "https://example.com/ai2_ta.vtt"
+            },
             status="published",
             published_at=datetime.utcnow()
         )
@@ -246,6 +262,26 @@ def seed():
             )
             db.session.add_all([thumb1, thumb2])
 
+        # ------------------
+        # TOPICS
+        # ------------------
+        programming = Topic(id=str(uuid.uuid4()), name="Programming")
+        ai = Topic(id=str(uuid.uuid4()), name="Artificial Intelligence")
+        beginner = Topic(id=str(uuid.uuid4()), name="Beginner")
+        db.session.add_all([programming, ai, beginner])
+        db.session.flush()
+
+        db.session.add_all([
+            ProgramTopic(program_id=program1.id, topic_id=programming.id),
+            ProgramTopic(program_id=program1.id, topic_id=beginner.id),
+            ProgramTopic(program_id=program2.id, topic_id=ai.id),
+            ProgramTopic(program_id=program2.id, topic_id=beginner.id)
+        ])
+
+        refresh_program_readiness([program1.id, program2.id])
+        refresh_lesson_readiness([lesson.id for lesson in [lesson1, lesson2, lesson3, lesson4, lesson5, lesson6]])
+        refresh_program_rollups([program1.id, program2.id])
+        rebuild_program_documents([program1.id, program2.id])
         db.session.commit()
         print("✅ Seeding complete!")
 
@@ -0,0 +1,85 @@
+-- Schema of the first release (string ids, json language lists), for upgrade tests
+
+CREATE TABLE programs (
+    id VARCHAR NOT NULL,
+    title VARCHAR NOT NULL,
+    description TEXT,
+    language_primary VARCHAR NOT NULL,
+    languages_available JSON NOT NULL,
+    status VARCHAR,
+    published_at TIMESTAMP WITHOUT TIME ZONE,
+    created_at TIMESTAMP WITHOUT TIME ZONE,
+    PRIMARY KEY (id)
+);
+
+CREATE TABLE topics (
+    id VARCHAR NOT NULL,
+    name VARCHAR NOT NULL,
+    PRIMARY KEY (id),
+    UNIQUE (name)
+);
+
+CREATE TABLE program_assets (
+    id VARCHAR NOT NULL,
+    program_id VARCHAR NOT NULL,
+    language VARCHAR NOT NULL,
+    variant VARCHAR NOT NULL,
+    asset_type VARCHAR NOT NULL,
+    url VARCHAR NOT NULL,
+    PRIMARY KEY (id),
+    CONSTRAINT uniq_program_asset UNIQUE (program_id, language, variant, asset_type),
+    FOREIGN KEY(program_id) REFERENCES programs (id)
+);
+
+CREATE TABLE program_topics (
+    program_id VARCHAR NOT NULL,
+    topic_id VARCHAR NOT NULL,
+    PRIMARY KEY (program_id, topic_id),
+    FOREIGN KEY(program_id) REFERENCES programs (id),
+    FOREIGN KEY(topic_id) REFERENCES topics (id)
+);
+
+CREATE TABLE terms (
+    id VARCHAR NOT NULL,
+    program_id VARCHAR NOT NULL,
+    term_number INTEGER NOT NULL,
+    title VARCHAR,
+    created_at TIMESTAMP WITHOUT TIME ZONE,
+    PRIMARY KEY (id),
+    CONSTRAINT uq_program_term UNIQUE (program_id, term_number),
+    FOREIGN KEY(program_id) REFERENCES programs (id)
+);
+
+CREATE TABLE lessons (
+    id VARCHAR NOT NULL,
+    term_id VARCHAR NOT NULL,
+    lesson_number INTEGER NOT NULL,
+    title VARCHAR NOT NULL,
+    content_type VARCHAR NOT NULL,
+    duration_ms INTEGER,
+    is_paid BOOLEAN,
+    content_language_primary VARCHAR NOT NULL,
+    content_languages_available JSON NOT NULL,
+    content_urls_by_language JSON NOT NULL,
+    subtitle_languages JSON,
+    subtitle_urls_by_language JSON,
+    status VARCHAR,
+    publish_at TIMESTAMP WITHOUT TIME ZONE,
+    published_at TIMESTAMP WITHOUT TIME ZONE,
+    created_at TIMESTAMP WITHOUT TIME ZONE,
+    PRIMARY KEY (id),
+    CONSTRAINT uq_term_lesson UNIQUE (term_id, lesson_number),
+    FOREIGN KEY(term_id) REFERENCES terms (id)
+);
+
+CREATE TABLE lesson_assets (
+    id VARCHAR NOT NULL,
+    lesson_id VARCHAR NOT NULL,
+    language VARCHAR NOT NULL,
+    variant VARCHAR NOT NULL,
+    asset_type VARCHAR NOT NULL,
+    url VARCHAR NOT NULL,
+    PRIMARY KEY (id),
+    CONSTRAINT uniq_lesson_asset UNIQUE (lesson_id, language, variant, asset_type),
+    FOREIGN KEY(lesson_id) REFERENCES lessons (id)
+);
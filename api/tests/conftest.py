@@ -0,0 +1,107 @@
+"""Fixtures for the API tests.
+
+They run against a disposable Postgres database, which they migrate,
+empty and reseed, so its URL must be given explicitly:
+
+    TEST_DATABASE_URL=postgresql://postgres@localhost/cms_test python -m pytest tests
+
+Without TEST_DATABASE_URL every test is skipped.
+"""
+import os
+import subprocess
+import sys
+
+import psycopg2
+import pytest
+from sqlalchemy.engine import make_url
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+# The api modules import each other by bare name, as when run from api/
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, API_DIR)
+
+if TEST_DATABASE_URL:
+    # Read when app is imported: no replica, and query budgets that raise
+    os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+    os.environ.pop("REPLICA_DATABASE_URL", None)
+    os.environ["QUERY_BUDGETS_STRICT"] = "true"
+
+
+@pytest.fixture(scope="session")
+def app():
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+
+    from app import app
+    app.config["QUERY_BUDGETS_STRICT"] = True
+    return app
+
+
+@pytest.fixture(scope="session")
+def catalog(app):
+    """Seed a small synthetic catalog; ids and values for parameterised paths."""
+    import migrate
+    from db import db
+    from generate_catalog import generate
+    from models import Program, Lesson, Topic
+
+    migrate.migrate()
+    generate(programs=30, terms=2, lessons=10, languages=["en", "hi", "ta"], scheduled_every=4, reset=True)
+
+    def first(query):
+        return db.session.execute(query.limit(1)).scalar()
+
+    with app.app_context():
+        in_catalog = Program.published_lesson_count > 0
+        return {
+            "program_id": first(db.select(Program.id).where(in_catalog).order_by(Program.id)),
+            "language": first(db.select(Program.language_primary).where(in_catalog).order_by(Program.id)),
+            "lesson_id": first(db.select(Lesson.id).where(Lesson.status == "published").order_by(Lesson.id)),
+            "draft_lesson_id": first(db.select(Lesson.id).where(Lesson.status == "draft").order_by(Lesson.id)),
+            "topic_id": first(db.select(Topic.id).order_by(Topic.name)),
+        }
+
+
+@pytest.fixture
+def client(app, catalog):
+    """An admin test client, with the catalog caches emptied so every request hits the database."""
+    from cache import clear_caches
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["user"] = "admin"
+        session["role"] = "admin"
+    clear_caches()
+    return client
+
+
+def database_url(name):
+    """TEST_DATABASE_URL pointed at another database on the same server."""
+    return make_url(TEST_DATABASE_URL).set(database=name).render_as_string(hide_password=False)
+
+
+def run_script(url, *args):
+    """Run an api/ script (python <args>) against the database at url; returns its stdout."""
+    env = {**os.environ, "DATABASE_URL": url}
+    result = subprocess.run([sys.executable, *args], cwd=API_DIR, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stdout + result.stderr
+    return result.stdout
+
+
+@pytest.fixture
+def scratch_database():
+    """URL of an empty database, dropped after the test, for migrations and other processes."""
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+
+    name = f"{make_url(TEST_DATABASE_URL).database}_scratch"
+    admin = psycopg2.connect(database_url("postgres"))
+    admin.autocommit = True
+    admin.cursor().execute(f"DROP DATABASE IF EXISTS {name}")
+    admin.cursor().execute(f"CREATE DATABASE {name}")
+    try:
+        yield database_url(name)
+    finally:
+        admin.cursor().execute(f"DROP DATABASE IF EXISTS {name} WITH (FORCE)")
+        admin.close()
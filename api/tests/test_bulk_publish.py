@@ -0,0 +1,111 @@
+"""POST /lessons/publish/bulk: scopes, the report, and lessons that change mid-publish."""
+import uuid
+
+import psycopg2
+import pytest
+
+import publishing
+from conftest import TEST_DATABASE_URL
+
+THUMBNAILS = [
+    {"language": "en", "variant": "portrait", "url": "https://x/p.jpg"},
+    {"language": "en", "variant": "landscape", "url": "https://x/l.jpg"},
+]
+
+
+@pytest.fixture
+def term(app, client):
+    """A draft term with lessons 1-3 ready to publish and lesson 4 missing a thumbnail."""
+    from db import db
+    from models import Lesson, Term
+
+    lessons = [
+        {
+            "lesson_number": number,
+            "title": f"Bulk {number}",
+            "content_type": "video",
+            "content_language_primary": "en",
+            "content_languages_available": ["en"],
+            "content_urls_by_language": {"en": f"https://x/{number}"},
+            "assets": THUMBNAILS if number < 4 else THUMBNAILS[:1],
+        }
+        for number in (1, 2, 3, 4)
+    ]
+    response = client.post("/import/programs", json={
+        "title": "Bulk publish",
+        "language_primary": "en",
+        "languages_available": ["en"],
+        "terms": [{"term_number": 1, "lessons": lessons}],
+    })
+    assert response.status_code == 200
+    program_id = response.get_json()["programs"][0]["id"]
+
+    with app.app_context():
+        term_id = db.session.scalar(db.select(Term.id).where(Term.program_id == program_id))
+        lesson_ids = db.session.execute(
+            db.select(Lesson.id).where(Lesson.term_id == term_id).order_by(Lesson.lesson_number)
+        ).scalars().all()
+    return {"program_id": program_id, "term_id": term_id, "lesson_ids": lesson_ids}
+
+
+def statuses(app, lesson_ids):
+    from db import db
+    from models import Lesson
+
+    with app.app_context():
+        return [db.session.get(Lesson, lid).status for lid in lesson_ids]
+
+
+@pytest.mark.parametrize("scope", [
+    {"term_id": str(uuid.uuid4())},
+    {"program_id": str(uuid.uuid4())},
+    {"term_id": "not-an-id"},
+    {"program_id": 7},
+])
+def test_unknown_scope_is_404(client, scope):
+    response = client.post("/lessons/publish/bulk", json=scope)
+    assert response.status_code == 404
+    assert response.get_json()["code"] == "NOT_FOUND"
+
+
+def test_ui_unknown_program_is_404(client):
+    assert client.post(f"/ui/programs/{uuid.uuid4()}/publish-lessons").status_code == 404
+
+
+def test_publishes_ready_lessons(app, client, term):
+    one, two, three, four = term["lesson_ids"]
+    response = client.post("/lessons/publish/bulk", json={"term_id": term["term_id"]})
+
+    assert response.status_code == 200
+    report = response.get_json()
+    assert report["published"] == [one, two, three]
+    assert report["skipped"] == [{"id": four, "reason": "ASSETS_MISSING", "missing_thumbnails": ["landscape"]}]
+    assert statuses(app, term["lesson_ids"]) == ["published", "published", "published", "draft"]
+
+
+def test_lessons_changed_after_the_read_are_left_alone(app, client, term, monkeypatch):
+    one, two, three, four = term["lesson_ids"]
+    classify = publishing.classify
+
+    def classify_then_race(candidates):
+        result = classify(candidates)
+        # Another session commits between the candidates read and the UPDATE
+        with psycopg2.connect(TEST_DATABASE_URL) as conn, conn.cursor() as cursor:
+            cursor.execute("UPDATE lessons SET status = 'archived' WHERE id = %s", (one,))
+            cursor.execute("UPDATE lessons SET has_landscape_thumbnail = false WHERE id = %s", (two,))
+        conn.close()
+        monkeypatch.setattr(publishing, "classify", classify)
+        return result
+
+    monkeypatch.setattr(publishing, "classify", classify_then_race)
+    response = client.post("/lessons/publish/bulk", json={"program_id": term["program_id"]})
+
+    assert response.status_code == 200
+    report = response.get_json()
+    assert report["published"] == [three]
+    assert sorted(report["skipped"], key=lambda entry: entry["id"]) == sorted([
+        {"id": four, "reason": "ASSETS_MISSING", "missing_thumbnails": ["landscape"]},
+        {"id": one, "reason": "ARCHIVED"},
+        {"id": two, "reason": "ASSETS_MISSING", "missing_thumbnails": ["landscape"]},
+    ], key=lambda entry: entry["id"])
+    assert statuses(app, term["lesson_ids"]) == ["archived", "draft", "published", "draft"]
@@ -0,0 +1,15 @@
+"""The async catalog service drains the worker's rebuild queue on its own."""
+from starlette.testclient import TestClient
+
+
+def test_startup_starts_the_rebuild_consumer(app, catalog, monkeypatch):
+    import catalog_async
+
+    started = []
+    monkeypatch.setattr(catalog_async, "start_rebuild_consumer", lambda: started.append(True))
+
+    with TestClient(catalog_async.app) as client:
+        assert started == [True]
+        assert client.get("/health").status_code == 200
+        response = client.get(f"/catalog/programs/{catalog['program_id']}")
+        assert response.status_code == 200
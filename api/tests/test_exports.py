@@ -0,0 +1,68 @@
+"""Catalog export: the stored documents, with out-of-date ones rendered live (read-time publishing)."""
+import json
+
+import pytest
+
+import catalog as catalog_module
+from exports import ndjson_chunks
+
+
+@pytest.fixture
+def out_of_date(app, catalog):
+    """Two programs whose stored documents are out of date: one expired, one missing."""
+    from db import db
+    from models import CatalogDocument, Lesson, Program, Term
+
+    with app.app_context():
+        expired, missing = db.session.execute(
+            db.select(Program.id).join(CatalogDocument, CatalogDocument.program_id == Program.id)
+            .where(Program.id != catalog["program_id"]).order_by(Program.id.desc()).limit(2)
+        ).scalars().all()
+
+        db.session.execute(
+            db.update(CatalogDocument).where(CatalogDocument.program_id == expired)
+            .values(document='{"stale":true}', expires_at=db.func.now() - db.text("interval '1 minute'"))
+        )
+        # A lesson of missing is due, but its document is gone
+        lesson_id = db.session.scalar(
+            db.select(Lesson.id).join(Term).where(Term.program_id == missing, Lesson.thumbnails_ready)
+            .order_by(Lesson.id).limit(1)
+        )
+        db.session.execute(
+            db.update(Lesson).where(Lesson.id == lesson_id)
+            .values(status="scheduled", publish_at=db.func.now() - db.text("interval '1 minute'"))
+        )
+        db.session.execute(db.delete(CatalogDocument).where(CatalogDocument.program_id == missing))
+        db.session.commit()
+
+    yield {"expired": expired, "missing": missing}
+
+    with app.app_context():
+        catalog_module.rebuild_program_documents([expired, missing])
+        db.session.commit()
+
+
+def export(app):
+    with app.app_context():
+        body = b"".join(ndjson_chunks(catalog_module.export_documents()))
+        return [json.loads(line) for line in body.decode().splitlines()]
+
+
+def test_export_renders_out_of_date_documents_live(app, out_of_date, monkeypatch):
+    monkeypatch.setattr(catalog_module, "READ_TIME_PUBLISHING", True)
+    documents = export(app)
+
+    ids = [document["id"] for document in documents]
+    assert ids == sorted(ids)
+    assert {"stale": True} not in documents
+    with app.app_context():
+        for program_id in out_of_date.values():
+            assert documents[ids.index(program_id)] == catalog_module.get_program_detail(program_id)
+
+
+def test_export_streams_stored_documents(app, out_of_date, monkeypatch):
+    monkeypatch.setattr(catalog_module, "READ_TIME_PUBLISHING", False)
+    documents = export(app)
+
+    assert {"stale": True} in documents
+    assert out_of_date["missing"] not in [document.get("id") for document in documents]
@@ -0,0 +1,74 @@
+"""POST /import/programs validation: every problem reported, nothing written."""
+import pytest
+
+from models import Program
+
+
+def lesson(number, **fields):
+    return {
+        "lesson_number": number,
+        "title": f"Lesson {number}",
+        "content_type": "video",
+        "content_language_primary": "en",
+        "content_languages_available": ["en"],
+        "content_urls_by_language": {"en": f"https://x/{number}"},
+        **fields,
+    }
+
+
+def tree(title="Imported program", **fields):
+    return {
+        "title": title,
+        "language_primary": "en",
+        "languages_available": ["en"],
+        "terms": [{"term_number": 1, "lessons": [lesson(1), lesson(2)]}],
+        **fields,
+    }
+
+
+def program_count(app, title):
+    with app.app_context():
+        return Program.query.filter_by(title=title).count()
+
+
+def test_import_creates_the_tree(app, client):
+    response = client.post("/import/programs", json=tree("Imported ok"))
+    assert response.status_code == 200
+    assert response.get_json()["counts"]["lessons"] == 2
+    assert program_count(app, "Imported ok") == 1
+
+
+@pytest.mark.parametrize("value", [5, "abc", {"term_number": 1}, True])
+@pytest.mark.parametrize("field, path, build", [
+    ("terms", "programs[0].terms", lambda value: tree("Bad children", terms=value)),
+    ("lessons", "programs[0].terms[0].lessons",
+     lambda value: tree("Bad children", terms=[{"term_number": 1, "lessons": value}])),
+    ("program assets", "programs[0].assets", lambda value: tree("Bad children", assets=value)),
+    ("lesson assets", "programs[0].terms[0].lessons[0].assets",
+     lambda value: tree("Bad children", terms=[{"term_number": 1, "lessons": [lesson(1, assets=value)]}])),
+])
+def test_wrong_type_children_are_one_error(app, client, field, path, build, value):
+    response = client.post("/import/programs", json=[build(value)])
+
+    assert response.status_code == 400
+    assert response.get_json()["errors"] == [{"path": path, "message": "must be of type list"}]
+    assert program_count(app, "Bad children") == 0
+
+
+def test_every_problem_is_reported(app, client):
+    bad = tree("Many problems", status="published", terms=[
+        {"term_number": 1, "lessons": [lesson(1, content_type="podcast"), "nope"]},
+        {"term_number": 1, "lessons": [lesson(1, status="scheduled")]},
+    ])
+    response = client.post("/import/programs", json={"programs": [bad, 7]})
+
+    assert response.status_code == 400
+    assert {error["path"] for error in response.get_json()["errors"]} == {
+        "programs[0].assets",
+        "programs[0].terms[0].lessons[0].content_type",
+        "programs[0].terms[0].lessons[1]",
+        "programs[0].terms[1].term_number",
+        "programs[0].terms[1].lessons[0].publish_at",
+        "programs[1]",
+    }
+    assert program_count(app, "Many problems") == 0
@@ -0,0 +1,93 @@
+"""Upgrading a database created by the first release (string ids, json columns)."""
+import os
+
+import psycopg2
+import pytest
+
+from conftest import run_script
+
+BASELINE_SCHEMA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline_schema.sql")
+
+PROGRAM_ID = "11111111-1111-1111-1111-111111111111"
+
+BASELINE_ROWS = f"""
+INSERT INTO programs VALUES ('{PROGRAM_ID}', 'Old program', 'd', 'en', '["en", "hi"]', 'published', now(), now());
+INSERT INTO topics VALUES ('44444444-4444-4444-4444-444444444444', 'History');
+INSERT INTO program_topics VALUES ('{PROGRAM_ID}', '44444444-4444-4444-4444-444444444444');
+INSERT INTO program_assets VALUES
+    ('55555555-5555-5555-5555-555555555551', '{PROGRAM_ID}', 'en', 'portrait', 'poster', 'https://x/p.jpg'),
+    ('55555555-5555-5555-5555-555555555552', '{PROGRAM_ID}', 'en', 'landscape', 'poster', 'https://x/l.jpg');
+INSERT INTO terms VALUES ('22222222-2222-2222-2222-222222222222', '{PROGRAM_ID}', 1, 'Term 1', now());
+INSERT INTO lessons VALUES
+    ('33333333-3333-3333-3333-333333333331', '22222222-2222-2222-2222-222222222222', 1, 'Published', 'video',
+     60000, false, 'en', '["en"]', '{{"en": "https://x/1"}}', '["hi"]', '{{"hi": "https://x/1.vtt"}}',
+     'published', NULL, now(), now()),
+    ('33333333-3333-3333-3333-333333333332', '22222222-2222-2222-2222-222222222222', 2, 'Draft', 'video',
+     60000, true, 'en', '["en"]', '{{"en": "https://x/2"}}', NULL, NULL, 'draft', NULL, NULL, now());
+INSERT INTO lesson_assets VALUES
+    ('66666666-6666-6666-6666-666666666661', '33333333-3333-3333-3333-333333333331', 'en', 'portrait', 'thumbnail', 'https://x/t.jpg');
+"""
+
+
+@pytest.fixture
+def baseline_database(scratch_database):
+    with psycopg2.connect(scratch_database) as conn, conn.cursor() as cur:
+        with open(BASELINE_SCHEMA) as f:
+            cur.execute(f.read())
+        cur.execute(BASELINE_ROWS)
+    return scratch_database
+
+
+def fetch(url, sql):
+    with psycopg2.connect(url) as conn, conn.cursor() as cur:
+        cur.execute(sql)
+        return cur.fetchall()
+
+
+def assert_uuid_keys(url):
+    from migrate_uuid import id_columns
+
+    types = dict(((table, column), data_type) for table, column, data_type in fetch(url, """
+        SELECT table_name, column_name, data_type FROM information_schema.columns
+        WHERE table_schema = current_schema()
+    """))
+    existing = {key for key in id_columns() if key in types}
+    assert {key: types[key] for key in existing} == {key: "uuid" for key in existing}
+    assert fetch(url, "SELECT conname FROM pg_constraint WHERE contype = 'f' AND NOT convalidated") == []
+    assert fetch(url, "SELECT column_name FROM information_schema.columns WHERE column_name LIKE '%\\_uuid'") == []
+
+
+def test_migrate_upgrades_baseline_schema(baseline_database):
+    run_script(baseline_database, "migrate.py")
+
+    assert_uuid_keys(baseline_database)
+    # Language lists converted through shadow columns, values and NOT NULL kept
+    assert fetch(baseline_database, """
+        SELECT table_name, column_name, data_type, is_nullable FROM information_schema.columns
+        WHERE column_name IN ('languages_available', 'content_languages_available', 'subtitle_languages')
+        ORDER BY 1, 2
+    """) == [
+        ("lessons", "content_languages_available", "jsonb", "NO"),
+        ("lessons", "subtitle_languages", "jsonb", "YES"),
+        ("programs", "languages_available", "jsonb", "NO"),
+    ]
+    assert fetch(baseline_database, "SELECT languages_available FROM programs") == [(["en", "hi"],)]
+    assert fetch(baseline_database, "SELECT subtitle_languages FROM lessons ORDER BY lesson_number") == [(["hi"],), (None,)]
+    assert fetch(
+        baseline_database, "SELECT column_name FROM information_schema.columns WHERE column_name LIKE '%\\_jsonb'"
+    ) == []
+    assert fetch(baseline_database, "SELECT tgname FROM pg_trigger WHERE NOT tgisinternal") == []
+    # Derived data backfilled: rollups, readiness and the catalog document
+    assert fetch(baseline_database, "SELECT published_lesson_count, has_portrait_poster FROM programs") == [(1, True)]
+    assert fetch(baseline_database, "SELECT program_id::text FROM catalog_documents") == [(PROGRAM_ID,)]
+    assert fetch(baseline_database, "SELECT count(*) FROM lessons") == [(2,)]
+
+    # Re-running is a no-op
+    assert "every id column is already uuid" not in run_script(baseline_database, "migrate.py")
+
+
+def test_uuid_phases_run_standalone(baseline_database):
+    run_script(baseline_database, "migrate_uuid.py", "all")
+
+    assert_uuid_keys(baseline_database)
+    assert fetch(baseline_database, "SELECT count(*) FROM program_topics") == [(1,)]
@@ -0,0 +1,69 @@
+"""Every view with a @query_budget stays within it (QUERY_BUDGETS_STRICT raises)."""
+import pytest
+
+from cache import clear_caches
+from metrics import QueryBudgetExceeded
+
+# Paths covering every budgeted view; {name} fields come from the catalog fixture
+BUDGETED_PATHS = [
+    "/catalog/programs",
+    "/catalog/programs?language={language}",
+    "/catalog/programs?subtitle={language}",
+    "/catalog/programs?topic={topic_id}",
+    "/catalog/programs/{program_id}",
+    "/catalog/lessons/{lesson_id}",
+    "/catalog/search?q=python",
+    "/catalog/search?q=python&lang={language}&language={language}",
+    "/catalog/changes",
+    "/catalog/changes?limit=5",
+    "/catalog-ui",
+    "/export/catalog",
+    "/export/catalog?gzip=1",
+    "/topics",
+    "/dashboard",
+    "/ui/programs",
+    "/ui/programs?q=python&sort=title&dir=asc",
+    "/ui/programs?page=1000000",
+    "/ui/programs/{program_id}",
+    "/ui/lessons/{draft_lesson_id}",
+    "/ui/not-ready",
+]
+
+
+def get(client, path):
+    response = client.get(path)
+    response.get_data()  # streamed bodies run their queries (and the budget check) here
+    return response
+
+
+@pytest.mark.parametrize("path", BUDGETED_PATHS)
+def test_within_budget(client, catalog, path):
+    response = get(client, path.format(**catalog))
+    assert response.status_code == 200
+
+
+def test_second_listing_page_within_budget(client):
+    cursor = get(client, "/catalog/programs?limit=5").get_json()["next_cursor"]
+    assert cursor
+    clear_caches()
+    assert get(client, f"/catalog/programs?limit=5&cursor={cursor}").status_code == 200
+
+
+def test_every_budgeted_view_is_covered(app, catalog):
+    adapter = app.url_map.bind("localhost")
+    covered = {adapter.match(path.format(**catalog).split("?")[0])[0] for path in BUDGETED_PATHS}
+    budgeted = {name for name, view in app.view_functions.items() if hasattr(view, "query_budget")}
+    assert budgeted - covered == set()
+
+
+@pytest.mark.parametrize("endpoint, path", [
+    ("api.get_catalog_program", "/catalog/programs/{program_id}"),
+    ("api.ui_programs", "/ui/programs"),
+    # Streamed: the queries and the check run while the body is read
+    ("api.catalog_ui", "/catalog-ui"),
+    ("exports.export_catalog", "/export/catalog"),
+])
+def test_over_budget_raises(app, client, catalog, monkeypatch, endpoint, path):
+    monkeypatch.setattr(app.view_functions[endpoint], "query_budget", 0)
+    with pytest.raises(QueryBudgetExceeded, match="budget 0"):
+        get(client, path.format(**catalog))
@@ -0,0 +1,52 @@
+"""Worker publishes reach the catalog documents without any API request."""
+import time
+
+from conftest import TEST_DATABASE_URL, run_script
+
+WORKER_CYCLE = """
+import sys
+sys.path.insert(0, "../worker")
+from worker import app, run_cycle
+with app.app_context():
+    run_cycle()
+"""
+
+
+def wait_for(app, query, timeout=10):
+    """Poll query (a function of the session) until it returns something truthy."""
+    from db import db
+
+    deadline = time.monotonic() + timeout
+    while True:
+        with app.app_context():
+            result = query(db.session)
+        if result or time.monotonic() > deadline:
+            return result
+        time.sleep(0.1)
+
+
+def test_worker_publishes_are_rebuilt_by_the_listener(app, catalog):
+    from app import start_rebuild_consumer
+    from db import db
+    from models import CatalogLessonDocument, CatalogRebuildQueue, Lesson, Term
+
+    with app.app_context():
+        lesson_id, program_id = db.session.execute(
+            db.select(Lesson.id, Term.program_id).join(Term)
+            .where(Lesson.status == "scheduled", Lesson.thumbnails_ready).order_by(Lesson.id).limit(1)
+        ).one()
+        db.session.execute(
+            db.update(Lesson).where(Lesson.id == lesson_id)
+            .values(publish_at=db.func.timezone("utc", db.func.now()) - db.text("interval '1 minute'"))
+        )
+        db.session.commit()
+
+    # What app.py and catalog_async do at startup, before serving anything
+    assert start_rebuild_consumer().is_alive()
+
+    run_script(TEST_DATABASE_URL, "-c", WORKER_CYCLE)
+
+    assert wait_for(app, lambda session: session.get(CatalogLessonDocument, lesson_id))
+    assert wait_for(app, lambda session: session.get(CatalogRebuildQueue, program_id) is None)
+    with app.app_context():
+        assert db.session.get(Lesson, lesson_id).status == "published"
@@ -0,0 +1,32 @@
+"""GET /ui/programs title search."""
+import pytest
+
+TITLES = ["Search 100% Python", "Search 1000 Python", "Search snake_case", "Search snakeXcase", "Search back\\slash"]
+
+
+@pytest.fixture(scope="module")
+def titled(app, catalog):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["user"] = "admin"
+        session["role"] = "admin"
+    response = client.post("/import/programs", json=[
+        {"title": title, "language_primary": "en", "languages_available": ["en"]} for title in TITLES
+    ])
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize("q, expected", [
+    ("100%", ["Search 100% Python"]),
+    ("%", ["Search 100% Python"]),
+    ("snake_case", ["Search snake_case"]),
+    ("_case", ["Search snake_case"]),
+    ("back\\s", ["Search back\\slash"]),
+    ("search 10", ["Search 100% Python", "Search 1000 Python"]),
+])
+def test_search_matches_wildcards_literally(client, titled, q, expected):
+    response = client.get("/ui/programs", query_string={"q": q})
+    assert response.status_code == 200
+
+    html = response.get_data(as_text=True)
+    assert [title for title in TITLES if f">{title}<" in html] == expected
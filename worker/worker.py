@@ -1,8 +1,10 @@
+import json
+import select
 import time
-from datetime import datetime
+import psycopg2
 from flask import Flask
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import func
 import os
 
 app = Flask(__name__)
@@ -13,76 +15,300 @@ app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
 db = SQLAlchemy(app)
 
+BATCH_SIZE = int(os.getenv("WORKER_BATCH_SIZE", "500"))
+
+# Upper bound on any single sleep, as a safety net for missed wakeups
+MAX_SLEEP_SECONDS = float(os.getenv("WORKER_MAX_SLEEP_SECONDS", "300"))
+
+# Sent by the API whenever a lesson is scheduled or rescheduled
+SCHEDULE_CHANNEL = "lesson_schedule_changed"
+
+METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "9100"))
+
+# Same switch as api/catalog.py: the API's catalog already shows due
+# lessons from when they went live, so that's the published_at persisted
+# here: publish_at, or when the thumbnails arrived if that was later
+# (keep in sync with catalog.due_since)
+READ_TIME_PUBLISHING = os.getenv("CATALOG_READ_TIME_PUBLISHING", "false").lower() == "true"
+PUBLISHED_AT_SQL = "GREATEST(l.publish_at, l.ready_at)" if READ_TIME_PUBLISHING else "timezone('utc', now())"
+
+# -------------------
+# METRICS
 # -------------------
-# MODELS
+
+LOOP_DURATION = Histogram(
+    "cms_worker_loop_duration_seconds",
+    "Time spent publishing per wakeup (all batches)"
+)
+BATCH_SIZE_OBSERVED = Histogram(
+    "cms_worker_batch_size",
+    "Lessons published per batch",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+)
+BACKLOG_DEPTH = Gauge(
+    "cms_worker_backlog_lessons",
+    "Publishable lessons already due at the start of the last wakeup"
+)
+BLOCKED_LESSONS = Gauge(
+    "cms_worker_blocked_lessons",
+    "Due scheduled lessons held back for missing thumbnails"
+)
+PUBLISH_LAG = Histogram(
+    "cms_worker_publish_lag_seconds",
+    "Delay between a lesson's publish_at and its actual publish",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600)
+)
+LESSONS_PUBLISHED = Counter("cms_worker_lessons_published_total", "Lessons auto-published")
+PROGRAMS_PUBLISHED = Counter("cms_worker_programs_published_total", "Programs auto-published")
+WORKER_ERRORS = Counter("cms_worker_errors_total", "Worker loop errors")
+
+# -------------------
+# PROGRAM ROLLUPS
 # -------------------
 
-class Program(db.Model):
-    __tablename__ = "programs"
-    id = db.Column(db.String, primary_key=True)
-    status = db.Column(db.String)
-    published_at = db.Column(db.DateTime)
+# Mirrors api/catalog.py REFRESH_ROLLUPS_SQL; keep the two in sync.
+REFRESH_ROLLUPS_SQL = """
+UPDATE programs AS p SET
+    published_term_count = s.term_count,
+    published_lesson_count = s.lesson_count,
+    published_duration_ms = s.duration_ms,
+    paid_lesson_count = s.paid_count,
+    free_lesson_count = s.lesson_count - s.paid_count
+FROM programs AS target
+CROSS JOIN LATERAL (
+    SELECT
+        COUNT(DISTINCT l.term_id) AS term_count,
+        COUNT(l.id) AS lesson_count,
+        COALESCE(SUM(l.duration_ms), 0) AS duration_ms,
+        COUNT(l.id) FILTER (WHERE l.is_paid) AS paid_count
+    FROM terms t
+    JOIN lessons l ON l.term_id = t.id AND l.status = 'published'
+    WHERE t.program_id = target.id AND target.status != 'archived'
+) AS s
+WHERE p.id = target.id AND target.id = ANY(CAST(:program_ids AS uuid[]))
+"""
+
+
+def refresh_program_rollups(program_ids):
+    if program_ids:
+        db.session.execute(db.text(REFRESH_ROLLUPS_SQL), {"program_ids": list(program_ids)})
+
 
+# Same channel/payload format as api/cache.py: a JSON list of program
+# ids, or "*" when too many changed to fit in one payload.
+CATALOG_CHANNEL = "catalog_changed"
+MAX_NOTIFY_IDS = 100
 
-class Lesson(db.Model):
-    __tablename__ = "lessons"
-    id = db.Column(db.String, primary_key=True)
-    term_id = db.Column(db.String)
-    status = db.Column(db.String)
-    publish_at = db.Column(db.DateTime)
-    published_at = db.Column(db.DateTime)
 
+# Catalog documents are rendered by the API; queue the programs and the
+# API's catalog listener rebuilds them when the NOTIFY arrives.
+QUEUE_REBUILD_SQL = """
+INSERT INTO catalog_rebuild_queue (program_id, queued_at)
+SELECT unnest(CAST(:program_ids AS uuid[])), timezone('utc', now())
+ON CONFLICT (program_id) DO NOTHING
+"""
 
-class Term(db.Model):
-    __tablename__ = "terms"
-    id = db.Column(db.String, primary_key=True)
-    program_id = db.Column(db.String)
+
+def queue_document_rebuilds(program_ids):
+    if program_ids:
+        db.session.execute(db.text(QUEUE_REBUILD_SQL), {"program_ids": list(program_ids)})
+
+
+def notify_programs_changed(program_ids):
+    if not program_ids:
+        return
+    program_ids = sorted(program_ids)
+    payload = "*" if len(program_ids) > MAX_NOTIFY_IDS else json.dumps(program_ids)
+    db.session.execute(
+        db.text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": CATALOG_CHANNEL, "payload": payload}
+    )
 
 
 # -------------------
 # WORKER LOGIC
 # -------------------
 
-def run_worker():
-    print("🟢 Worker started... Checking scheduled lessons every 30 seconds")
+# Ids are uuid columns: statements return them as text (the API's id
+# form, which JSON payloads need) and take them back as uuid[] arrays.
 
-    while True:
-        with app.app_context():
-            try:
-                # Find lessons that should be published
-                lessons = Lesson.query.filter(
-                    Lesson.status == "scheduled",
-                    Lesson.publish_at <= func.now()
-                ).all()
+# Claims up to :batch_size due lessons and publishes them in one
+# statement. SKIP LOCKED lets several worker replicas run side by side:
+# each claims a disjoint set of rows and nothing is published twice.
+# Lessons without their required thumbnails (readiness flags maintained
+# by the API) stay scheduled until the assets arrive. The due condition
+# is api/catalog.py DUE_LESSON_SQL; keep the two in sync.
+CLAIM_AND_PUBLISH_SQL = f"""
+WITH due AS (
+    SELECT id FROM lessons
+    WHERE status = 'scheduled' AND publish_at <= now()
+      AND has_portrait_thumbnail AND has_landscape_thumbnail
+    ORDER BY publish_at
+    LIMIT :batch_size
+    FOR UPDATE SKIP LOCKED
+)
+UPDATE lessons AS l
+SET status = 'published', published_at = {PUBLISHED_AT_SQL}, updated_at = timezone('utc', now())
+FROM due
+WHERE l.id = due.id
+RETURNING l.id::text, l.term_id::text, EXTRACT(EPOCH FROM (now() - l.publish_at::timestamptz)) AS lag_seconds
+"""
+
+# Parent programs of the given terms, locked in id order so concurrent
+# batches touching the same programs can't deadlock. NO KEY UPDATE still
+# serializes batches but lets the API's document inserts (FK checks take
+# KEY SHARE) through, so an API rebuild can't deadlock with the batch.
+LOCK_PROGRAMS_SQL = """
+SELECT p.id::text FROM programs p
+WHERE p.id IN (SELECT program_id FROM terms WHERE id = ANY(CAST(:term_ids AS uuid[])))
+ORDER BY p.id
+FOR NO KEY UPDATE
+"""
+
+# Same poster rule as the API's publish_program; archived programs stay archived
+AUTO_PUBLISH_PROGRAMS_SQL = """
+UPDATE programs
+SET status = 'published', published_at = timezone('utc', now()), updated_at = timezone('utc', now())
+WHERE id = ANY(CAST(:program_ids AS uuid[])) AND status = 'draft'
+  AND has_portrait_poster AND has_landscape_poster
+RETURNING id::text
+"""
+
+
+def publish_due_batch(batch_size=BATCH_SIZE):
+    """Publish one batch of due lessons in its own transaction.
+
+    Returns the number of lessons published.
+    """
+    lessons = db.session.execute(
+        db.text(CLAIM_AND_PUBLISH_SQL), {"batch_size": batch_size}
+    ).all()
 
-                if lessons:
-                    print(f"⏰ Found {len(lessons)} scheduled lesson(s)")
+    if not lessons:
+        db.session.commit()
+        return 0
 
-                for lesson in lessons:
-                    print(f"➡ Auto-publishing lesson: {lesson.id}")
+    print(f"⏰ Published {len(lessons)} scheduled lesson(s)")
 
-                    # 🔓 AUTO-PUBLISH (NO ASSET VALIDATION)
-                    lesson.status = "published"
-                    lesson.published_at = datetime.utcnow()
+    term_ids = list({lesson.term_id for lesson in lessons})
+    program_ids = db.session.execute(
+        db.text(LOCK_PROGRAMS_SQL), {"term_ids": term_ids}
+    ).scalars().all()
 
-                    # Find parent program
-                    term = Term.query.get(lesson.term_id)
-                    if term:
-                        program = Program.query.get(term.program_id)
+    auto_published = db.session.execute(
+        db.text(AUTO_PUBLISH_PROGRAMS_SQL), {"program_ids": program_ids}
+    ).scalars().all()
+    for program_id in auto_published:
+        print(f"📢 Program auto-published: {program_id}")
 
-                        # Auto-publish program if not already published
-                        if program and program.status != "published":
-                            program.status = "published"
-                            program.published_at = datetime.utcnow()
-                            print(f"📢 Program auto-published: {program.id}")
+    refresh_program_rollups(program_ids)
+    queue_document_rebuilds(program_ids)
+    notify_programs_changed(program_ids)
+    db.session.commit()
 
-                db.session.commit()
+    # Only counted once the batch is committed
+    BATCH_SIZE_OBSERVED.observe(len(lessons))
+    LESSONS_PUBLISHED.inc(len(lessons))
+    PROGRAMS_PUBLISHED.inc(len(auto_published))
+    for lesson in lessons:
+        PUBLISH_LAG.observe(max(float(lesson.lag_seconds), 0))
+
+    return len(lessons)
+
+
+# Seconds until the earliest publishable scheduled lesson is due
+# (negative if overdue, NULL if nothing is scheduled). Served by the
+# partial index ix_lessons_scheduled_ready_publish_at.
+NEXT_DUE_SQL = """
+SELECT EXTRACT(EPOCH FROM (MIN(publish_at)::timestamptz - now()))
+FROM lessons
+WHERE status = 'scheduled' AND has_portrait_thumbnail AND has_landscape_thumbnail
+"""
+
+
+BACKLOG_SQL = """
+SELECT
+    COUNT(*) FILTER (WHERE has_portrait_thumbnail AND has_landscape_thumbnail),
+    COUNT(*) FILTER (WHERE NOT (has_portrait_thumbnail AND has_landscape_thumbnail))
+FROM lessons
+WHERE status = 'scheduled' AND publish_at <= now()
+"""
+
+
+def seconds_until_next_due():
+    delay = db.session.execute(db.text(NEXT_DUE_SQL)).scalar()
+    db.session.commit()
+    return None if delay is None else float(delay)
+
+
+def connect_listener():
+    conn = psycopg2.connect(app.config["SQLALCHEMY_DATABASE_URI"])
+    conn.autocommit = True
+    conn.cursor().execute(f"LISTEN {SCHEDULE_CHANNEL}")
+    return conn
+
+
+def wait_for_schedule_change(conn, timeout):
+    """Sleep up to timeout seconds, returning early on a schedule NOTIFY."""
+    if conn is None:
+        time.sleep(timeout)
+        return
+
+    if select.select([conn], [], [], timeout) != ([], [], []):
+        conn.poll()
+        conn.notifies.clear()
+
+
+def run_cycle():
+    """Publish everything due, update the gauges; return how long to sleep."""
+    # Sampled before draining: afterwards the ready backlog is almost always 0.
+    # Publishing never touches blocked lessons, so that count holds either way.
+    backlog, blocked = db.session.execute(db.text(BACKLOG_SQL)).one()
+    db.session.commit()
+    BACKLOG_DEPTH.set(backlog)
+    BLOCKED_LESSONS.set(blocked)
+
+    # Keep going while batches come back full (catching up a backlog)
+    with LOOP_DURATION.time():
+        while publish_due_batch() == BATCH_SIZE:
+            pass
+
+    # Overdue rows left over are claimed by another replica;
+    # the small floor avoids spinning until it commits
+    delay = seconds_until_next_due()
+    if delay is None:
+        return MAX_SLEEP_SECONDS
+    return min(max(delay, 0.05), MAX_SLEEP_SECONDS)
+
+
+def run_worker():
+    print("🟢 Worker started... Sleeping until the next scheduled lesson is due")
+    start_http_server(METRICS_PORT)
+
+    listener = None
+
+    while True:
+        with app.app_context():
+            try:
+                if listener is None:
+                    listener = connect_listener()
+                timeout = run_cycle()
 
             except Exception as e:
                 db.session.rollback()
+                WORKER_ERRORS.inc()
                 print("❌ Worker error:", e)
+                if listener is not None:
+                    listener.close()
+                listener = None
+                timeout = 5
 
-        time.sleep(30)
+        try:
+            wait_for_schedule_change(listener, timeout)
+        except Exception as e:
+            print("❌ Worker listener error:", e)
+            listener.close()
+            listener = None
 
 
 if __name__ == "__main__":